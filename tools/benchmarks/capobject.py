@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measure the cost of building CapBaseObject objects.
+
+Usage: capobject.py [NUMBER]
+"""
+
+import sys
+import warnings
+from datetime import date
+from decimal import Decimal
+from timeit import repeat
+
+from weboob.capabilities.bank import Transaction
+
+warnings.simplefilter('ignore')
+
+NUMBER = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+DATE = date(2013, 10, 1)
+AMOUNT = Decimal('-12.5')
+
+
+def empty():
+    return Transaction(u'1')
+
+
+def assignments():
+    tr = Transaction(u'1')
+    tr.date = DATE
+    tr.rdate = DATE
+    tr.type = Transaction.TYPE_CARD
+    tr.raw = u'CARTE 01/10 COFFEE SHOP'
+    tr.category = u'CARTE'
+    tr.label = u'COFFEE SHOP'
+    tr.amount = AMOUNT
+    return tr
+
+
+def conversions():
+    tr = Transaction(u'1')
+    tr.date = DATE
+    tr.rdate = DATE
+    tr.type = long(Transaction.TYPE_CARD)
+    tr.raw = 'CARTE 01/10 COFFEE SHOP'
+    tr.category = 'CARTE'
+    tr.label = 'COFFEE SHOP'
+    tr.amount = '-12.5'
+    return tr
+
+
+def from_values():
+    return Transaction.from_values(u'1', date=DATE, rdate=DATE, type=Transaction.TYPE_CARD,
+                                   raw=u'CARTE 01/10 COFFEE SHOP', category=u'CARTE',
+                                   label=u'COFFEE SHOP', amount=AMOUNT)
+
+
+for func in (empty, assignments, conversions, from_values):
+    best = min(repeat(func, number=NUMBER, repeat=3))
+    print '%-12s %8.2f us/object' % (func.__name__, best / NUMBER * 1e6)
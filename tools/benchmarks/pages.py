@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measure the time to find the page of an url in the PAGES of a legacy
+BaseBrowser, by compiling and trying every regexp as it was done before,
+and with the dispatch table of the browser.
+
+Usage: pages.py [NUMBER_OF_PAGES]
+"""
+
+import re
+import sys
+from time import time
+
+from weboob.tools.browser.browser import _PagesIndex
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+LOOPS = 2000
+
+
+def linear(pages, url):
+    for key, value in pages.items():
+        if isinstance(key, basestring):
+            if not key.startswith('^') and not key.endswith('$'):
+                regexp = re.compile('^%s$' % key)
+            else:
+                regexp = re.compile(key)
+        else:
+            regexp = key
+        m = regexp.search(url)
+        if m:
+            return value, m
+
+
+# Looks like the PAGES of a bank module.
+pages = {}
+urls = []
+for i in xrange(COUNT):
+    pages['https://www.bank.fr/portal/section%d/page\.do\?id=(?P<id>\d+).*' % i] = 'Page%d' % i
+    urls.append('https://www.bank.fr/portal/section%d/page.do?id=42&token=abc' % i)
+pages['https://www.bank.fr/.*'] = 'Other'
+urls.append('https://www.bank.fr/unknown')
+pages['.*/logout.*'] = 'Logout'
+urls.append('https://www.bank.fr/logout')
+
+index = _PagesIndex(pages)
+for url in urls:
+    assert linear(pages, url)[0] == index.match(url)[0]
+
+
+def measure(func):
+    start = time()
+    for i in xrange(LOOPS):
+        for url in urls:
+            func(url)
+    return (time() - start) / (LOOPS * len(urls)) * 1e6
+
+
+print '%d PAGES, %d urls' % (len(pages), len(urls))
+print '%-10s %8.2f us' % ('linear', measure(lambda url: linear(pages, url)))
+print '%-10s %8.2f us' % ('index', measure(index.match))
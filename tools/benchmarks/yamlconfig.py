@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measure the time to load a large storage file with YamlConfig, by parsing
+the YAML file and from its snapshot.
+
+Usage: yamlconfig.py [SIZE_IN_MB]
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+from time import time
+
+from weboob.tools.config.yamlconfig import YamlConfig, Loader
+
+SIZE = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+
+def build(path):
+    def backend(n):
+        seen = dict(('%d@forum' % i, {'comments': range(i, i + 10), 'date': 1380000000 + i})
+                    for i in xrange(n * 10000, (n + 1) * 10000))
+        return {'seen': seen, 'lastpurge': 1380000000}
+
+    # Measure the size of one backend to know how many are needed.
+    config = YamlConfig(path)
+    config.values = {'backends': {'backend0': backend(0)}}
+    config.save()
+    count = int(SIZE * 1024 * 1024 / os.path.getsize(path)) + 1
+
+    config.values = {'backends': dict(('backend%d' % n, backend(n)) for n in xrange(count))}
+    config.save()
+
+
+def load(path):
+    start = time()
+    YamlConfig(path).load()
+    return time() - start
+
+
+workdir = tempfile.mkdtemp()
+try:
+    path = os.path.join(workdir, 'bench.storage')
+    build(path)
+    print 'YAML file: %.1f MB, loader: %s' % (os.path.getsize(path) / 1024. / 1024, Loader.__name__)
+
+    os.remove(path + YamlConfig.SNAPSHOT_SUFFIX)
+    print '%-10s %8.3f s' % ('parse', load(path))
+    print '%-10s %8.3f s' % ('snapshot', min(load(path) for i in xrange(3)))
+finally:
+    shutil.rmtree(workdir)
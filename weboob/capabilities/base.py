@@ -23,6 +23,7 @@ import datetime
 import re
 from decimal import Decimal
 from copy import deepcopy, copy
+from itertools import izip
 
 from weboob.tools.misc import to_unicode
 from weboob.tools.date import new_date, new_datetime
@@ -163,6 +164,12 @@ class Field(object):
         """
         return value
 
+    def normalize(self, value):
+        """
+        Get the value to store, once it has been checked.
+        """
+        return value
+
 
 class IntField(Field):
     """
@@ -232,14 +239,18 @@ class DateField(Field):
 
     def __setattr__(self, name, value):
         if name == 'value':
-            # Force use of our date and datetime types, to fix bugs in python2
-            # with strftime on year<1900.
-            if type(value) is datetime.datetime:
-                value = new_datetime(value)
-            if type(value) is datetime.date:
-                value = new_date(value)
+            value = self.normalize(value)
         return object.__setattr__(self, name, value)
 
+    def normalize(self, value):
+        # Force use of our date and datetime types, to fix bugs in python2
+        # with strftime on year<1900.
+        if type(value) is datetime.datetime:
+            value = new_datetime(value)
+        if type(value) is datetime.date:
+            value = new_date(value)
+        return value
+
 
 class TimeField(Field):
     """
@@ -257,6 +268,38 @@ class DeltaField(Field):
         Field.__init__(self, doc, datetime.timedelta, **kwargs)
 
 
+# Types of default values which can be shared by objects.
+IMMUTABLE_TYPES = (type, bool, int, long, float, basestring, Decimal,
+                   datetime.date, datetime.time, datetime.timedelta, tuple, frozenset)
+
+
+class DeletedField(object):
+    """
+    Stored instead of the value of a field deleted from an object.
+    """
+
+
+class FieldValue(object):
+    """
+    Descriptor to get the value of a field from the values list of an object.
+    """
+    __slots__ = ('name', 'index')
+
+    def __init__(self, name, index):
+        self.name = name
+        self.index = index
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+
+        value = obj._values[self.index]
+        if value is DeletedField:
+            raise AttributeError("'%s' object has no attribute '%s'" % (
+                obj.__class__.__name__, self.name))
+        return value
+
+
 class _CapBaseObjectMeta(type):
     def __new__(cls, name, bases, attrs):
         fields = [(field_name, attrs.pop(field_name)) for field_name, obj in attrs.items() if isinstance(obj, Field)]
@@ -269,6 +312,25 @@ class _CapBaseObjectMeta(type):
             new_class._fields = deepcopy(new_class._fields)
         new_class._fields.update(fields)
 
+        # Fields descriptors are shared by every objects of the class, which
+        # only store their values in a list.
+        # The setters table gives, for each field, its index in this list,
+        # the field, the types for which the value is stored without any
+        # conversion, and the function to normalize the value if any.
+        new_class._setters = {}
+        new_class._defaults = []
+        new_class._mutable_defaults = []
+        for index, (field_name, field) in enumerate(new_class._fields.iteritems()):
+            normalize = field.normalize
+            if normalize.im_func is Field.normalize.im_func:
+                normalize = None
+            new_class._setters[field_name] = (index, field, frozenset(field.types), normalize)
+            new_class._defaults.append(field.value)
+            if not isinstance(field.value, IMMUTABLE_TYPES) and field.value is not None:
+                new_class._mutable_defaults.append(index)
+            if field_name not in attrs:
+                setattr(new_class, field_name, FieldValue(field_name, index))
+
         if new_class.__doc__ is None:
             new_class.__doc__ = ''
         for name, field in fields:
@@ -309,10 +371,23 @@ class CapBaseObject(object):
     backend = None
     _fields = None
 
+    def __new__(cls, *args, **kwargs):
+        obj = object.__new__(cls)
+        # Values are set before __init__ as subclasses may set fields before
+        # calling it.
+        values = list(cls._defaults)
+        for index in cls._mutable_defaults:
+            values[index] = deepcopy(values[index])
+        object.__setattr__(obj, '_values', values)
+        return obj
+
     def __init__(self, id=u'', backend=None):
         self.id = to_unicode(id)
         self.backend = backend
-        self._fields = deepcopy(self._fields)
+
+    def _set_ids(self, id=u'', backend=None):
+        object.__setattr__(self, 'id', to_unicode(id))
+        object.__setattr__(self, 'backend', backend)
 
     @property
     def fullid(self):
@@ -338,7 +413,7 @@ class CapBaseObject(object):
 
     def copy(self):
         obj = copy(self)
-        obj._fields = copy(self._fields)
+        obj._values = list(self._values)
         return obj
 
     def set_empty_fields(self, value, excepts=()):
@@ -363,8 +438,9 @@ class CapBaseObject(object):
 
         if hasattr(self, 'id') and self.id is not None:
             yield 'id', self.id
-        for name, field in self._fields.iteritems():
-            yield name, field.value
+        for name, value in izip(self._fields, self._values):
+            if value is not DeletedField:
+                yield name, value
 
     def __eq__(self, obj):
         if isinstance(obj, CapBaseObject):
@@ -372,22 +448,59 @@ class CapBaseObject(object):
         else:
             return False
 
-    def __getattr__(self, name):
-        if self._fields is not None and name in self._fields:
-            return self._fields[name].value
+    @classmethod
+    def from_values(klass, *args, **values):
+        """
+        Build an object and set values of its fields at once.
+
+        Values are trusted: contrary to a field assignment, they are neither
+        converted nor checked, so they must have a type accepted by their
+        field.
+
+        >>> from decimal import Decimal
+        >>> from weboob.capabilities.bank import Transaction
+        >>> tr = Transaction.from_values(u'1', label=u'Coffee', amount=Decimal('-2.5'))
+        >>> tr.id, tr.label, tr.amount
+        (u'1', u'Coffee', Decimal('-2.5'))
+
+        :param args: arguments given to the constructor
+        :param values: values of fields
+        :rtype: :class:`CapBaseObject`
+        """
+        if klass.__init__.im_func is CapBaseObject.__init__.im_func:
+            # Same as the constructor, without the checks of __setattr__().
+            obj = klass.__new__(klass)
+            obj._set_ids(*args)
         else:
-            raise AttributeError("'%s' object has no attribute '%s'" % (
-                self.__class__.__name__, name))
+            obj = klass(*args)
+        setters = klass._setters
+        obj_values = obj._values
+        for name, value in values.iteritems():
+            try:
+                index, attr, types, normalize = setters[name]
+            except KeyError:
+                raise FieldNotFound(obj, name)
+
+            if normalize is None:
+                obj_values[index] = value
+            else:
+                obj_values[index] = normalize(value)
+        return obj
 
     def __setattr__(self, name, value):
-        try:
-            attr = (self._fields or {})[name]
-        except KeyError:
-            if not name in dir(self) and not name.startswith('_'):
+        # Not a try/except block, as id and backend are set by the
+        # constructor of every object and they are not fields.
+        setter = self._setters.get(name)
+        if setter is None:
+            if not name.startswith('_') and not name in self.__dict__ and not hasattr(self.__class__, name):
                 warnings.warn('Creating a non-field attribute %s. Please prefix it with _' % name,
                               AttributeCreationWarning, stacklevel=2)
             object.__setattr__(self, name, value)
-        else:
+            return
+
+        index, attr, types, normalize = setter
+        # Values which have exactly an accepted type don't need any conversion.
+        if type(value) not in types:
             if not empty(value):
                 try:
                     # Try to convert value to the wanted one.
@@ -408,13 +521,20 @@ class CapBaseObject(object):
                 raise ValueError(
                     'Value for "%s" needs to be of type %r, not %r' % (
                         name, attr.types, type(value)))
-            attr.value = value
+
+        if normalize is not None:
+            value = normalize(value)
+        self._values[index] = value
 
     def __delattr__(self, name):
         try:
-            self._fields.pop(name)
+            index = self._setters[name][0]
         except KeyError:
             object.__delattr__(self, name)
+        else:
+            if self._values[index] is DeletedField:
+                raise AttributeError(name)
+            self._values[index] = DeletedField
 
     def to_dict(self):
         def iter_decorate(d):
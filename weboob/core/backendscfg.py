@@ -39,6 +39,9 @@ class BackendsConfig(object):
 
     def __init__(self, confpath):
         self.confpath = confpath
+        # Parsed file, and modification time and size it was parsed at
+        self._config = None
+        self._config_key = None
         try:
             mode = os.stat(confpath).st_mode
         except OSError:
@@ -60,9 +63,28 @@ class BackendsConfig(object):
                     raise self.WrongPermissions(
                         u'Weboob will not start as long as config file %s is readable by group or other users.' % confpath)
 
+    def _read(self):
+        """
+        Get the parsed file, which is only read again when it has changed.
+
+        The returned object must not be modified unless the file is written.
+        """
+        try:
+            st = os.stat(self.confpath)
+        except OSError:
+            key = None
+        else:
+            key = (st.st_mtime, st.st_size)
+
+        if self._config is None or key is None or key != self._config_key:
+            config = RawConfigParser()
+            config.read(self.confpath)
+            self._config = config
+            self._config_key = key
+        return self._config
+
     def iter_backends(self):
-        config = RawConfigParser()
-        config.read(self.confpath)
+        config = self._read()
         changed = False
         for backend_name in config.sections():
             params = dict(config.items(backend_name))
@@ -87,9 +109,7 @@ class BackendsConfig(object):
         """
         Return True if the backend exists in config.
         """
-        config = RawConfigParser()
-        config.read(self.confpath)
-        return name in config.sections()
+        return self._read().has_section(name)
 
     def add_backend(self, backend_name, module_name, params, edit=False):
         if not backend_name:
@@ -20,15 +20,34 @@
 
 
 
+from collections import deque
 from copy import copy
-from threading import Thread, Event, RLock, Timer
+from threading import Thread, Event, Lock, RLock, Condition, local
+from time import time
 
 from weboob.capabilities.base import CapBaseObject
 from weboob.tools.misc import get_backtrace
 from weboob.tools.log import getLogger
 
 
-__all__ = ['BackendsCall', 'CallErrors']
+__all__ = ['BackendsCall', 'CallErrors', 'CallTimeout']
+
+
+# Calls which are consumed by the current thread
+_consumer = local()
+
+# Pool used by calls created without one
+_default_workers = None
+_default_workers_lock = Lock()
+
+
+def _get_default_workers():
+    global _default_workers
+    with _default_workers_lock:
+        if _default_workers is None:
+            from weboob.core.workers import WorkerPool
+            _default_workers = WorkerPool()
+        return _default_workers
 
 
 class CallErrors(Exception):
@@ -44,38 +63,107 @@ class CallErrors(Exception):
         return self.errors.__iter__()
 
 
+class CallTimeout(Exception):
+    """
+    Stored in :class:`CallErrors` for a backend which has not finished in time.
+    """
+
+
 class BackendsCall(object):
     def __init__(self, backends, function, *args, **kwargs):
         """
+        Call backends with default options; see :func:`create` to give
+        options.
+
+        :param backends: List of backends to call
+        :type backends: list[:class:`BaseBackend`]
+        :param function: backends' method name, or callable object.
+        :type function: :class:`str` or :class:`callable`
+        :param args: arguments to give to function
+        :param kwargs: keyword arguments to give to function
+        """
+        self._start(backends, function, args, kwargs)
+
+    @classmethod
+    def create(klass, backends, function, args, kwargs, workers=None, max_buffer=None,
+               timeout=None, per_backend_timeout=None):
+        """
+        Call backends.
+
         :param backends: List of backends to call
         :type backends: list[:class:`BaseBackend`]
         :param function: backends' method name, or callable object.
         :type function: :class:`str` or :class:`callable`
+        :param args: arguments to give to function
+        :type args: :class:`tuple`
+        :param kwargs: keyword arguments to give to function
+        :type kwargs: :class:`dict`
+        :param workers: pool of threads used to call backends; by default, a
+                        pool shared by calls created without one
+        :type workers: :class:`weboob.core.workers.WorkerPool`
+        :param max_buffer: if specified, maximum number of results waiting to
+                           be consumed; backends are paused when it is reached
+        :type max_buffer: :class:`int`
+        :param timeout: if specified, maximum number of seconds for the whole call
+        :type timeout: :class:`float`
+        :param per_backend_timeout: if specified, maximum number of seconds for
+                                    each backend, since it has been called
+        :type per_backend_timeout: :class:`float`
+        :rtype: :class:`BackendsCall`
         """
+        call = klass.__new__(klass)
+        call._start(backends, function, args, kwargs, workers, max_buffer, timeout, per_backend_timeout)
+        return call
+
+    def _start(self, backends, function, args, kwargs, workers=None, max_buffer=None,
+               timeout=None, per_backend_timeout=None):
         self.logger = getLogger('bcall')
         # Store if a backend is finished
         self.backends = {}
         for backend in backends:
             self.backends[backend.name] = False
+        # Backends instances, to report those which are timed out
+        self.instances = dict((backend.name, backend) for backend in backends)
         # Global mutex on object
         self.mutex = RLock()
         # Event set when every backends have give their data
         self.finish_event = Event()
-        # Event set when there are new responses
-        self.response_event = Event()
+        # Notified when there are new responses, or when every backends are finished
+        self.response_ready = Condition(self.mutex)
+        # Notified when responses are consumed
+        self.response_taken = Condition(self.mutex)
         # Waiting responses
-        self.responses = []
+        self.responses = deque()
+        self.max_buffer = max_buffer
+        # Set when responses are not wanted anymore
+        self.drop_responses = False
+        # Set when the consumer does an other call before taking the next result
+        self.consumer_away = False
+        # Function called when there are new responses, see set_notifier()
+        self.notifier = None
+        # Deadline of the whole call, and of every running backends
+        self.deadline = time() + timeout if timeout is not None else None
+        self.per_backend_timeout = per_backend_timeout
+        self.deadlines = {}
         # Errors
         self.errors = []
-        # Threads
-        self.threads = []
+        # Pool of threads
+        if workers is None:
+            workers = _get_default_workers()
+        self.workers = workers
+
+        # If the current thread is consuming results of other calls, it won't
+        # take them until this one is over, so they must not pause backends,
+        # as they may be needed here.
+        for call in getattr(_consumer, 'calls', ()):
+            call._release_buffer()
 
         # Create jobs for each backend
-        with self.mutex:
-            for backend in backends:
-                self.threads.append(Timer(0, self._caller, (backend, function, args, kwargs)).start())
-            if not backends:
-                self.finish_event.set()
+        self.jobs = {}
+        for backend in backends:
+            self.jobs[backend.name] = self.workers.submit(backend.NAME, self._caller, backend, function, args, kwargs)
+        if not backends:
+            self.finish_event.set()
 
     def _store_error(self, backend, error):
         with self.mutex:
@@ -83,15 +171,106 @@ class BackendsCall(object):
             self.errors.append((backend, error, backtrace))
 
     def _store_result(self, backend, result):
+        """
+        Store a result of a backend.
+
+        :returns: False if the backend has been stopped and must not give more results
+        """
+        if isinstance(result, CapBaseObject):
+            result.backend = backend.name
+
+        with self.mutex:
+            if self.deadlines:
+                self._expire()
+
+            if self.max_buffer and len(self.responses) >= self.max_buffer:
+                # The consumer may wait for results of an other call
+                # in this pool.
+                with self.workers.blocking():
+                    while len(self.responses) >= self.max_buffer and not self.backends[backend.name] and \
+                          not self.drop_responses and not self.consumer_away:
+                        self.response_taken.wait()
+
+            if self.backends[backend.name]:
+                return False
+
+            if not self.drop_responses:
+                self.responses.append((backend, result))
+                self.response_ready.notify()
+                if self.notifier:
+                    self.notifier()
+            return True
+
+    def _set_finished(self, backend, error=None):
         with self.mutex:
-            if isinstance(result, CapBaseObject):
-                result.backend = backend.name
-            self.responses.append((backend, result))
-            self.response_event.set()
+            if self.backends[backend.name]:
+                return
+
+            if error is not None:
+                self._store_error(backend, error)
+
+            # This backend is now finished
+            self.backends[backend.name] = True
+            self.deadlines.pop(backend.name, None)
+            # Wake up the backend if it is paused
+            self.response_taken.notifyAll()
+            for finished in self.backends.itervalues():
+                if not finished:
+                    return
+            self.finish_event.set()
+            self.response_ready.notifyAll()
+            if self.notifier:
+                self.notifier()
+
+    def _set_timed_out(self, name, error):
+        self.logger.debug('%s: Timed out' % name)
+        self._set_finished(self.instances[name], error)
+        # The backend may be stuck, so its thread is not counted in the pool
+        # anymore, not to prevent other calls from running.
+        job = self.jobs.get(name)
+        if job is not None:
+            self.workers.abandon(job)
+
+    def _expire(self):
+        """
+        Stop backends which are timed out.
+
+        :returns: number of seconds before the next deadline, or None
+        """
+        now = time()
+        with self.mutex:
+            for name, deadline in self.deadlines.items():
+                if deadline <= now:
+                    self._set_timed_out(name, CallTimeout('Timed out after %ss' % self.per_backend_timeout))
+
+            if self.deadline is not None and self.deadline <= now:
+                for name, finished in self.backends.items():
+                    if not finished:
+                        self._set_timed_out(name, CallTimeout('Call timed out'))
+
+            deadlines = self.deadlines.values()
+            if self.deadline is not None and not self.finish_event.isSet():
+                deadlines.append(self.deadline)
+            if deadlines:
+                return max(min(deadlines) - now, 0)
+            return None
 
     def _caller(self, backend, function, args, kwargs):
+        # This backend may be timed out or canceled before it is started.
+        if self.backends[backend.name]:
+            return
+
         with backend:
             try:
+                if self.backends[backend.name]:
+                    return
+
+                if self.per_backend_timeout is not None:
+                    with self.mutex:
+                        self.deadlines[backend.name] = time() + self.per_backend_timeout
+                        # The consumer has to know when it should wake up
+                        self.response_ready.notifyAll()
+
                 # Call method on backend
                 try:
                     self.logger.debug('%s: Calling function %s' % (backend, function))
@@ -111,35 +290,74 @@ class BackendsCall(object):
                             for subresult in result:
                                 # Lock mutex only in loop in case the iterator is slow
                                 # (for example if backend do some parsing operations)
-                                self._store_result(backend, subresult)
+                                if not self._store_result(backend, subresult):
+                                    # Do not iterate anymore on a stopped backend
+                                    break
                         except Exception as error:
                             self._store_error(backend, error)
                     else:
                         self._store_result(backend, result)
             finally:
-                with self.mutex:
-                    # This backend is now finished
-                    self.backends[backend.name] = True
-                    for finished in self.backends.itervalues():
-                        if not finished:
-                            return
-                    self.response_event.set()
-                    self.finish_event.set()
+                self._set_finished(backend)
 
-    def _callback_thread_run(self, callback, errback):
-        responses = []
-        while not self.finish_event.isSet() or self.response_event.isSet():
-            self.response_event.wait()
+    def _wait_finished(self, responses=False):
+        """
+        Wait for every backends to be finished, or for a new response
+        if *responses* is True.
+
+        It must be called with the mutex held.
+        """
+        while not self.finish_event.isSet() and not (responses and self.responses):
+            timeout = self._expire()
+            if self.finish_event.isSet():
+                break
+            self.response_ready.wait(timeout)
+
+    def _iter_responses(self):
+        while True:
             with self.mutex:
-                responses = self.responses
-                self.responses = []
+                if not self.responses and not self.finish_event.isSet():
+                    with self.workers.blocking():
+                        self._wait_finished(responses=True)
+
+                if not self.responses:
+                    return
 
-                # Reset event
-                self.response_event.clear()
+                response = self.responses.popleft()
+                self.response_taken.notify()
 
-            # Consume responses
-            while responses:
-                callback(*responses.pop(0))
+            calls = _consumer.__dict__.setdefault('calls', [])
+            calls.append(self)
+            try:
+                yield response
+            except GeneratorExit:
+                # The consumer stops iterating, so paused backends would
+                # never be woken up.
+                self._abandon()
+                raise
+            finally:
+                calls.remove(self)
+                with self.mutex:
+                    self.consumer_away = False
+
+    def _abandon(self):
+        """
+        Stop the call when its results are not consumed anymore.
+        """
+        with self.mutex:
+            self.drop_responses = True
+            self.responses.clear()
+            self.cancel()
+            self.response_taken.notifyAll()
+
+    def _release_buffer(self):
+        with self.mutex:
+            self.consumer_away = True
+            self.response_taken.notifyAll()
+
+    def _callback_thread_run(self, callback, errback):
+        for backend, result in self._iter_responses():
+            callback(backend, result)
 
         if errback:
             with self.mutex:
@@ -165,28 +383,104 @@ class BackendsCall(object):
         thread.start()
         return thread
 
+    def set_notifier(self, notifier):
+        """
+        Set a function to call everytimes there are new results, and when
+        every backends are finished. Results are then taken with
+        :func:`poll`, so an event loop can handle many calls without
+        a thread waiting for each of them.
+
+        The function is called without arguments from the backends threads,
+        while the call is locked, so it must return quickly and not use
+        this object. For example, with asyncio:
+
+        >>> call.set_notifier(lambda: loop.call_soon_threadsafe(on_results, call)) # doctest: +SKIP
+
+        :param notifier: function to call, or None to remove it
+        :type notifier: callable
+        """
+        with self.mutex:
+            self.notifier = notifier
+            if notifier is not None and (self.responses or self.finish_event.isSet()):
+                notifier()
+
+    def poll(self):
+        """
+        Take results which are available, without blocking.
+
+        When timeouts are set, the deadlines are checked at each call, so it
+        should be called again after the delay returned by
+        :func:`get_next_timeout`.
+
+        Errors are not raised; once :func:`is_finished` returns True,
+        they are listed in the :attr:`errors` attribute.
+
+        :returns: list of (backend, result) tuples
+        """
+        with self.mutex:
+            self._expire()
+
+            responses = list(self.responses)
+            self.responses.clear()
+            self.response_taken.notifyAll()
+            return responses
+
+    def get_next_timeout(self):
+        """
+        Get the number of seconds before :func:`poll` has to be called to
+        stop late backends.
+
+        :returns: number of seconds, or None if there is no deadline
+        """
+        with self.mutex:
+            return self._expire()
+
+    def is_finished(self):
+        """
+        Return True if every backends are finished and there is no more
+        result to take.
+        """
+        with self.mutex:
+            return self.finish_event.isSet() and not self.responses
+
+    def cancel(self):
+        """
+        Stop every backends which are not finished yet.
+
+        Their next results are dropped, and they won't be called if they are
+        not started yet. Results already received can still be consumed.
+        """
+        with self.mutex:
+            for name, finished in self.backends.items():
+                if not finished:
+                    self._set_finished(self.instances[name])
+
     def wait(self):
-        self.finish_event.wait()
+        """
+        Wait for every backends to be finished.
 
+        If *max_buffer* is set, results which are not consumed yet, and
+        the next ones, are dropped, so backends are not paused forever.
+        """
         with self.mutex:
+            if self.max_buffer:
+                self.drop_responses = True
+                self.responses.clear()
+                self.response_taken.notifyAll()
+
+            with self.workers.blocking():
+                self._wait_finished()
+
             if self.errors:
                 raise CallErrors(self.errors)
 
     def __iter__(self):
-        # Don't know how to factorize with _callback_thread_run
-        responses = []
-        while not self.finish_event.isSet() or self.response_event.isSet():
-            self.response_event.wait()
-            with self.mutex:
-                responses = self.responses
-                self.responses = []
-
-                # Reset event
-                self.response_event.clear()
-
-            # Consume responses
-            while responses:
-                yield responses.pop(0)
+        try:
+            for response in self._iter_responses():
+                yield response
+        except GeneratorExit:
+            self._abandon()
+            raise
 
         # Raise errors
         with self.mutex:
@@ -20,12 +20,14 @@
 import os
 import imp
 import logging
+from contextlib import contextmanager
+from threading import RLock, local
 
 from weboob.tools.backend import BaseBackend
 from weboob.tools.log import getLogger
 
 
-__all__ = ['Module', 'ModulesLoader', 'RepositoryModulesLoader', 'ModuleLoadError']
+__all__ = ['Module', 'ModulesLoader', 'RepositoryModulesLoader', 'ModuleLoadError', 'LazyBackend']
 
 
 class ModuleLoadError(Exception):
@@ -97,6 +99,159 @@ class Module(object):
         return backend_instance
 
 
+class LazyBackend(object):
+    """
+    Proxy of a backend which imports its module and builds the backend when
+    one of its attributes is used for the first time.
+
+    Its name, description and capabilities are known from the information
+    given by repositories, so selecting backends on capabilities, listing,
+    locking or unloading them do not import the module. Reading its
+    configuration imports the module, but does not build the backend.
+
+    :param builder: function called with the configuration loaded by
+                    *config_loader* (or None) to build the backend
+    :type builder: callable
+    :param minfo: information about the module
+    :type minfo: :class:`weboob.core.repositories.ModuleInfo`
+    :param name: name of the backend instance
+    :type name: :class:`basestring`
+    :param config_loader: function called without arguments to load the
+                          configuration of the backend
+    :type config_loader: callable
+    """
+    def __init__(self, builder, minfo, name, config_loader=None):
+        self._builder = builder
+        self._config_loader = config_loader
+        self._config = None
+        self._minfo = minfo
+        self._backend = None
+        self.name = name
+        self.NAME = minfo.name
+        self.DESCRIPTION = minfo.description
+        self.LICENSE = minfo.license
+        self.lock = RLock()
+        # Blocks entered by each thread, to exit them in the same way if the
+        # backend is built in the meantime.
+        self._local = local()
+
+    def __enter__(self):
+        backend = self._backend
+        if backend is None:
+            self.lock.acquire()
+        else:
+            # The backend may allow concurrent calls.
+            backend.__enter__()
+        self._local.__dict__.setdefault('entered', []).append(backend)
+
+    def __exit__(self, t, v, tb):
+        backend = self._local.entered.pop()
+        if backend is None:
+            self.lock.release()
+        else:
+            backend.__exit__(t, v, tb)
+
+    def acquire_exclusive(self, blocking=True):
+        backend = self._backend
+        if backend is None:
+            if not self.lock.acquire(blocking):
+                return False
+            backend = self._backend
+            if backend is not None:
+                # Built in the meantime, it may allow concurrent calls.
+                try:
+                    if not backend.acquire_exclusive(blocking):
+                        return False
+                finally:
+                    self.lock.release()
+        elif not backend.acquire_exclusive(blocking):
+            return False
+        self._local.__dict__.setdefault('exclusive', []).append(backend)
+        return True
+
+    def release_exclusive(self):
+        backend = self._local.exclusive.pop()
+        if backend is None:
+            self.lock.release()
+        else:
+            backend.release_exclusive()
+
+    @contextmanager
+    def exclusive(self):
+        self.acquire_exclusive()
+        try:
+            yield
+        finally:
+            self.release_exclusive()
+
+    def __repr__(self):
+        return u"<Backend %r>" % self.name
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.get_backend(), name)
+
+    def get_backend(self):
+        """
+        Get the real backend, and build it if it is not already done.
+
+        Can raise a ModuleLoadError or a BaseBackend.ConfigError exception.
+
+        :rtype: :class:`weboob.tools.backend.BaseBackend`
+        """
+        with self.lock:
+            if self._backend is None:
+                backend = self._builder(self._config)
+                # Keep the lock which may be held by callers.
+                backend.lock = self.lock
+                self._backend = backend
+            return self._backend
+
+    @property
+    def config(self):
+        """
+        Configuration of the backend, loaded without building the backend.
+
+        :rtype: :class:`weboob.tools.backend.BackendConfig`
+        """
+        with self.lock:
+            if self._backend is not None:
+                return self._backend.config
+            if self._config_loader is None:
+                return self.get_backend().config
+            if self._config is None:
+                # Given to the backend when it is built.
+                self._config = self._config_loader()
+            return self._config
+
+    def is_loaded(self):
+        """
+        Return True if the real backend has been built.
+        """
+        return self._backend is not None
+
+    def has_caps(self, *caps):
+        """
+        Check if this backend implements at least one of these capabilities.
+        """
+        for c in caps:
+            if isinstance(c, (list, tuple)):
+                if self.has_caps(*c):
+                    return True
+            elif self._minfo.has_caps(c):
+                return True
+        return False
+
+    def save_browser_state(self):
+        if self._backend is not None:
+            self._backend.save_browser_state()
+
+    def deinit(self):
+        if self._backend is not None:
+            self._backend.deinit()
+
+
 class ModulesLoader(object):
     """
     Load modules.
@@ -106,14 +261,17 @@ class ModulesLoader(object):
         self.path = path
         self.loaded = {}
         self.logger = getLogger('modules')
+        # Modules may be loaded by several threads at the same time.
+        self.mutex = RLock()
 
     def get_or_load_module(self, module_name):
         """
         Can raise a ModuleLoadError exception.
         """
-        if module_name not in self.loaded:
-            self.load_module(module_name)
-        return self.loaded[module_name]
+        with self.mutex:
+            if module_name not in self.loaded:
+                self.load_module(module_name)
+            return self.loaded[module_name]
 
     def iter_existing_module_names(self):
         for name in os.listdir(self.path):
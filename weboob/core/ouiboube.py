@@ -20,15 +20,19 @@
 
 import pkg_resources
 import os
+from functools import partial
+from time import time
 
 from weboob.core.bcall import BackendsCall
-from weboob.core.modules import ModulesLoader, RepositoryModulesLoader, ModuleLoadError
+from weboob.core.modules import ModulesLoader, RepositoryModulesLoader, ModuleLoadError, LazyBackend
 from weboob.core.backendscfg import BackendsConfig
 from weboob.core.repositories import Repositories, IProgress
 from weboob.core.scheduler import Scheduler
+from weboob.core.workers import WorkerPool
 from weboob.tools.backend import BaseBackend
 from weboob.tools.config.iconfig import ConfigError
 from weboob.tools.log import getLogger
+from weboob.tools.ordereddict import OrderedDict
 
 
 __all__ = ['WebNip', 'Weboob']
@@ -51,12 +55,17 @@ class WebNip(object):
     :type storage: :class:`weboob.tools.storage.IStorage`
     :param scheduler: what scheduler to use; default is :class:`weboob.core.scheduler.Scheduler`
     :type scheduler: :class:`weboob.core.scheduler.IScheduler`
+    :param workers: pool of threads used to call backends; default is a
+                    :class:`weboob.core.workers.WorkerPool`
+    :type workers: :class:`weboob.core.workers.WorkerPool`
     """
     VERSION = '0.i'
+    # Maximum number of seconds deinit() waits for running calls.
+    DEINIT_TIMEOUT = 10
 
-    def __init__(self, modules_path=None, storage=None, scheduler=None):
+    def __init__(self, modules_path=None, storage=None, scheduler=None, workers=None):
         self.logger = getLogger('weboob')
-        self.backend_instances = {}
+        self.backend_instances = OrderedDict()
         self.callbacks = {'login':   lambda backend_name, value: None,
                           'captcha': lambda backend_name, image: None,
                          }
@@ -71,6 +80,10 @@ class WebNip(object):
             scheduler = Scheduler()
         self.scheduler = scheduler
 
+        if workers is None:
+            workers = WorkerPool()
+        self.workers = workers
+
         self.storage = storage
 
     def __deinit__(self):
@@ -81,7 +94,12 @@ class WebNip(object):
         Call this method when you stop using Weboob, to
         properly unload all correctly.
         """
-        self.unload_backends()
+        # Backends which have timed out may still be running.
+        if not self.workers.stop(self.DEINIT_TIMEOUT):
+            self.logger.warning('Some backends calls are still running')
+        self.unload_backends(blocking=False)
+        if self.storage is not None:
+            self.storage.flush()
 
     def build_backend(self, module_name, params=None, storage=None, name=None):
         """
@@ -139,12 +157,15 @@ class WebNip(object):
         self.backend_instances[name] = backend
         return backend
 
-    def unload_backends(self, names=None):
+    def unload_backends(self, names=None, blocking=True):
         """
         Unload backends.
 
         :param names: if specified, only unload that backends
         :type names: :class:`list`
+        :param blocking: if False, backends which are running a call are
+                         unloaded without being deinitialized
+        :type blocking: :class:`bool`
         """
         unloaded = {}
         if isinstance(names, basestring):
@@ -154,9 +175,15 @@ class WebNip(object):
 
         for name in names:
             backend = self.backend_instances.pop(name)
-            with backend:
-                backend.deinit()
             unloaded[backend.name] = backend
+            if not backend.acquire_exclusive(blocking):
+                self.logger.warning('%s is busy, it is not deinitialized' % backend.name)
+                continue
+            try:
+                backend.save_browser_state()
+                backend.deinit()
+            finally:
+                backend.release_exclusive()
 
         return unloaded
 
@@ -218,12 +245,28 @@ class WebNip(object):
         :type backends: list[:class:`str`]
         :param caps: iterate on backends which implement this caps
         :type caps: list[:class:`weboob.capabilities.base.IBaseCap`]
+        :param max_buffer: if specified, maximum number of results waiting to
+                           be consumed; backends are paused (and keep their
+                           lock) until the caller consumes them, except while
+                           the caller does an other :func:`do` call
+        :type max_buffer: :class:`int`
+        :param timeout: if specified, maximum number of seconds to wait for
+                        the backends; results received in time are still
+                        returned, and late backends are reported in
+                        :class:`weboob.core.bcall.CallErrors` with a
+                        :class:`weboob.core.bcall.CallTimeout` error; late
+                        backends are not interrupted, they keep running (and
+                        keep their lock) until their function returns
+        :type timeout: :class:`float`
+        :param per_backend_timeout: if specified, maximum number of seconds
+                                    given to each backend once it is called
+        :type per_backend_timeout: :class:`float`
         :rtype: A :class:`weboob.core.bcall.BackendsCall` object (iterable)
         """
         backends = self.backend_instances.values()
         _backends = kwargs.pop('backends', None)
         if _backends is not None:
-            if isinstance(_backends, BaseBackend):
+            if isinstance(_backends, (BaseBackend, LazyBackend)):
                 backends = [_backends]
             elif isinstance(_backends, basestring):
                 if len(_backends) > 0:
@@ -248,11 +291,16 @@ class WebNip(object):
             caps = kwargs.pop('caps')
             backends = [backend for backend in backends if backend.has_caps(caps)]
 
+        max_buffer = kwargs.pop('max_buffer', None)
+        timeout = kwargs.pop('timeout', None)
+        per_backend_timeout = kwargs.pop('per_backend_timeout', None)
+
         # The return value MUST BE the BackendsCall instance. Please never iterate
         # here on this object, because caller might want to use other methods, like
         # wait() on callback_thread().
         # Thanks a lot.
-        return BackendsCall(backends, function, *args, **kwargs)
+        return BackendsCall.create(backends, function, args, kwargs, self.workers, max_buffer,
+                                   timeout, per_backend_timeout)
 
     def schedule(self, interval, function, *args):
         """
@@ -313,11 +361,19 @@ class Weboob(WebNip):
     :type backends_filename: str
     :param storage: provide a storage where backends can save data
     :type storage: :class:`weboob.tools.storage.IStorage`
+    :param workers: pool of threads used to call backends
+    :type workers: :class:`weboob.core.workers.WorkerPool`
     """
     BACKENDS_FILENAME = 'backends'
 
-    def __init__(self, workdir=None, backends_filename=None, scheduler=None, storage=None):
-        super(Weboob, self).__init__(modules_path=False, scheduler=scheduler, storage=storage)
+    LOAD_CONCURRENCY = 8
+    """
+    Maximum number of backends built at the same time by
+    :func:`load_backends`.
+    """
+
+    def __init__(self, workdir=None, backends_filename=None, scheduler=None, storage=None, workers=None):
+        super(Weboob, self).__init__(modules_path=False, scheduler=scheduler, storage=storage, workers=workers)
 
         # Create WORKDIR
         if workdir is not None:
@@ -382,7 +438,7 @@ class Weboob(WebNip):
 
         return super(Weboob, self).build_backend(module_name, params, storage, name)
 
-    def load_backends(self, caps=None, names=None, modules=None, exclude=None, storage=None, errors=None):
+    def load_backends(self, caps=None, names=None, modules=None, exclude=None, storage=None, errors=None, lazy=False):
         """
         Load backends listed in config file.
 
@@ -398,10 +454,15 @@ class Weboob(WebNip):
         :type storage: :class:`weboob.tools.storage.IStorage`
         :param errors: if specified, store every errors in this list
         :type errors: list[:class:`LoadError`]
+        :param lazy: if True, modules are imported and backends are built
+                     when they are used for the first time (see
+                     :class:`weboob.core.modules.LazyBackend`); errors are
+                     then raised at this time
+        :type lazy: :class:`bool`
         :returns: loaded backends
         :rtype: dict[:class:`str`, :class:`weboob.tools.backend.BaseBackend`]
         """
-        loaded = {}
+        loaded = OrderedDict()
         if storage is None:
             storage = self.storage
 
@@ -409,6 +470,11 @@ class Weboob(WebNip):
             self.logger.error(u'Repositories are not consistent with the sources.list')
             raise VersionsMismatchError(u'Versions mismatch, please run "weboob-config update"')
 
+        # Installation of modules is not thread-safe, so it is done before
+        # loading backends in parallel. Modules are still imported one at a
+        # time, under the lock of the modules loader; only the construction
+        # of instances (which may run password commands) is concurrent.
+        to_load = []
         for instance_name, module_name, params in self.backends_config.iter_backends():
             if '_enabled' in params and not params['_enabled'].lower() in ('1', 'y', 'true', 'on', 'yes') or \
                names is not None and instance_name not in names or \
@@ -428,22 +494,58 @@ class Weboob(WebNip):
             if not minfo.is_installed():
                 self.repositories.install(minfo)
 
-            module = None
-            try:
-                module = self.modules_loader.get_or_load_module(module_name)
-            except ModuleLoadError as e:
-                self.logger.error(u'Unable to load module "%s": %s' % (module_name, e))
+            if lazy:
+                if instance_name in self.backend_instances:
+                    self.logger.warning(u'Oops, the backend "%s" is already loaded. Unload it before reloading...' % instance_name)
+                    self.unload_backends(instance_name)
+                builder = partial(self._load_backend, instance_name, module_name, params, storage)
+                config_loader = partial(self._load_backend_config, instance_name, module_name, params)
+                self.backend_instances[instance_name] = loaded[instance_name] = \
+                    LazyBackend(builder, minfo, instance_name, config_loader)
                 continue
 
+            to_load.append((instance_name, module_name, params))
+
+        start = time()
+        workers = WorkerPool(self.LOAD_CONCURRENCY)
+        try:
+            jobs = [workers.submit(None, self._load_backend, instance_name, module_name, params, storage)
+                    for instance_name, module_name, params in to_load]
+            for job in jobs:
+                job.wait()
+        finally:
+            workers.stop()
+
+        # Results are handled in the order of the configuration file.
+        for (instance_name, module_name, params), job in zip(to_load, jobs):
+            if isinstance(job.error, ModuleLoadError):
+                self.logger.error(u'Unable to load module "%s": %s' % (module_name, job.error))
+                continue
+            if isinstance(job.error, BaseBackend.ConfigError):
+                if errors is not None:
+                    errors.append(self.LoadError(instance_name, job.error))
+                continue
+            job.raise_error()
+
             if instance_name in self.backend_instances:
                 self.logger.warning(u'Oops, the backend "%s" is already loaded. Unload it before reloading...' % instance_name)
                 self.unload_backends(instance_name)
 
-            try:
-                backend_instance = module.create_instance(self, instance_name, params, storage)
-            except BaseBackend.ConfigError as e:
-                if errors is not None:
-                    errors.append(self.LoadError(instance_name, e))
-            else:
-                self.backend_instances[instance_name] = loaded[instance_name] = backend_instance
+            self.backend_instances[instance_name] = loaded[instance_name] = job.result
+
+        self.logger.debug(u'Loaded %d backends in %.3fs' % (len(loaded), time() - start))
         return loaded
+
+    def _load_backend(self, instance_name, module_name, params, storage, config=None):
+        start = time()
+        module = self.modules_loader.get_or_load_module(module_name)
+        if config is not None:
+            # Already loaded by _load_backend_config().
+            params = config
+        backend_instance = module.create_instance(self, instance_name, params, storage)
+        self.logger.debug(u'Built backend "%s" in %.3fs' % (instance_name, time() - start))
+        return backend_instance
+
+    def _load_backend_config(self, instance_name, module_name, params):
+        module = self.modules_loader.get_or_load_module(module_name)
+        return module.config.load(self, module.name, instance_name, params)
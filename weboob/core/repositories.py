@@ -19,6 +19,7 @@
 
 
 
+import ast
 import imp
 import tarfile
 import posixpath
@@ -28,21 +29,31 @@ import sys
 import os
 import subprocess
 import hashlib
+import cPickle
 from tempfile import NamedTemporaryFile
 from datetime import datetime
 from contextlib import closing
 from compileall import compile_dir
 from StringIO import StringIO
+from Queue import Queue
+
+import requests
 
 from .modules import Module
+from .workers import WorkerPool
+from weboob import capabilities
+from weboob.capabilities.base import IBaseCap
+from weboob.tools.backend import BaseBackend
 from weboob.tools.log import getLogger
 from weboob.tools.misc import to_unicode
 from weboob.tools.browser import StandardBrowser, BrowserUnavailable
+from weboob.tools.browser2.browser import BaseBrowser, Weboob, SHARED_TRANSPORTS
 from ConfigParser import RawConfigParser, DEFAULTSECT
 
 
 __all__ = ['IProgress', 'ModuleInstallError', 'ModuleInfo', 'RepositoryUnavailable',
-           'Repository', 'Versions', 'Repositories', 'InvalidSignature', 'Keyring']
+           'Repository', 'Versions', 'Repositories', 'InvalidSignature', 'Keyring',
+           'RepositoryBrowser']
 
 
 class WeboobBrowser(StandardBrowser):
@@ -55,6 +66,64 @@ class WeboobBrowser(StandardBrowser):
         klass.USER_AGENT = 'weboob/%s' % version
 
 
+class RepositoryBrowser(BaseBrowser):
+    """
+    Browser used to download repositories and modules.
+
+    Its connections are shared with other browsers using
+    :data:`weboob.tools.browser2.browser.SHARED_TRANSPORTS`, and it can be used
+    by several threads at the same time.
+    """
+    PROFILE = Weboob('<unspecified>')
+    TRANSPORTS = SHARED_TRANSPORTS
+    CHUNK_SIZE = 65536
+
+    @classmethod
+    def set_version(klass, version):
+        klass.PROFILE = Weboob(version)
+
+    def get(self, url, headers=None, stream=False):
+        """
+        Do a GET request.
+
+        Raises :class:`weboob.tools.browser.BrowserUnavailable` if the request
+        fails.
+
+        :param url: URL
+        :type url: str
+        :param headers: headers to add to the request
+        :type headers: dict
+        :param stream: if True, the body is not downloaded before
+                       returning the response
+        :type stream: bool
+        :rtype: :class:`requests.Response`
+        """
+        try:
+            response = self.session.get(url, headers=headers, stream=stream, timeout=self.TIMEOUT)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise BrowserUnavailable(unicode(e))
+        return response
+
+    def download(self, url, fp):
+        """
+        Download a file, without keeping it in memory.
+
+        :param url: URL
+        :type url: str
+        :param fp: file where the body is written
+        :type fp: file
+        """
+        response = self.get(url, stream=True)
+        try:
+            for chunk in response.iter_content(self.CHUNK_SIZE):
+                fp.write(chunk)
+        except requests.RequestException as e:
+            raise BrowserUnavailable(unicode(e))
+        finally:
+            response.close()
+
+
 class ModuleInfo(object):
     """
     Information about a module available on a repository.
@@ -122,6 +191,7 @@ class Repository(object):
     Represents a repository.
     """
     INDEX = 'modules.list'
+    INDEX_CACHE_SUFFIX = '.cache'
     KEYDIR = '.keys'
     KEYRING = 'trusted.gpg'
 
@@ -133,6 +203,10 @@ class Repository(object):
         self.local = None
         self.signed = False
         self.key_update = 0
+        # Validators of the index, used to download it again only if it has
+        # changed.
+        self.etag = None
+        self.last_modified = None
 
         self.modules = {}
 
@@ -159,13 +233,19 @@ class Repository(object):
             return self.url[len('file://'):]
         return self.url
 
-    def retrieve_index(self, repo_path):
+    def retrieve_index(self, repo_path, browser=None, previous_path=None):
         """
         Retrieve the index file of this repository. It can use network
         if this is a remote repository.
 
         :param repo_path: path to save the downloaded index file.
         :type repo_path: str
+        :param browser: browser to use to download the index
+        :type browser: :class:`RepositoryBrowser`
+        :param previous_path: path of the previously saved index file of this
+                              repository; it is used if the remote index has
+                              not been modified since
+        :type previous_path: str
         """
         if self.local:
             # Repository is local, open the file.
@@ -179,13 +259,39 @@ class Repository(object):
                 fp = open(filename, 'r')
         else:
             # This is a remote repository, download file
-            browser = WeboobBrowser()
+            if browser is None:
+                browser = RepositoryBrowser()
+
+            headers = {}
+            previous = None
+            if previous_path is not None:
+                try:
+                    previous = Repository(previous_path)
+                except (IOError, RepositoryUnavailable):
+                    pass
+                else:
+                    if previous.etag:
+                        headers['If-None-Match'] = previous.etag
+                    if previous.last_modified:
+                        headers['If-Modified-Since'] = previous.last_modified
+
             try:
-                fp = browser.openurl(posixpath.join(self.url, self.INDEX))
+                response = browser.get(posixpath.join(self.url, self.INDEX), headers)
             except BrowserUnavailable as e:
                 raise RepositoryUnavailable(unicode(e))
 
-        self.parse_index(fp)
+            self.etag = response.headers.get('ETag')
+            self.last_modified = response.headers.get('Last-Modified')
+            if response.status_code == 304 and previous is not None:
+                fp = open(previous_path, 'r')
+                # A 304 response usually does not repeat the validators.
+                self.etag = self.etag or previous.etag
+                self.last_modified = self.last_modified or previous.last_modified
+            else:
+                fp = StringIO(response.content)
+
+        with closing(fp):
+            self.parse_index(fp)
 
         if self.local:
             # Always rebuild index of a local repository.
@@ -255,6 +361,11 @@ class Repository(object):
         elif self.local is None:
             raise RepositoryUnavailable('Missing "url" key in settings')
 
+        if 'etag' in items:
+            self.etag = items['etag']
+        if 'last_modified' in items:
+            self.last_modified = items['last_modified']
+
         # Load modules
         self.modules.clear()
         for section in config.sections():
@@ -270,6 +381,11 @@ class Repository(object):
         """
         Rebuild index of modules of repository.
 
+        Information about modules which have not changed since the last
+        build is kept from a cache, stored next to the index file, as long
+        as weboob capabilities have not changed either. Other modules are
+        read from their sources, and only imported when it is not possible.
+
         :param path: path of the repository
         :type path: str
         :param filename: file to save index
@@ -285,33 +401,205 @@ class Repository(object):
             self.signed = False
             self.key_update = 0
 
+        cache_filename = filename + self.INDEX_CACHE_SUFFIX
+        try:
+            with open(cache_filename, 'rb') as fp:
+                cache = cPickle.load(fp)
+        except IOError:
+            cache = {}
+        except Exception as e:
+            print >>sys.stderr, 'Unable to read index cache %s: %s' % (cache_filename, e)
+            cache = {}
+
+        # Capabilities of modules are resolved from weboob.capabilities.
+        caps_signature = self.get_tree_signature(os.path.dirname(capabilities.__file__))
+        if isinstance(cache, dict) and cache.get('capabilities') == caps_signature:
+            cache = cache.get('modules', {})
+        else:
+            cache = {}
+
+        new_cache = {}
         for name in sorted(os.listdir(path)):
             module_path = os.path.join(path, name)
             if not os.path.isdir(module_path) or '.' in name or name == self.KEYDIR:
                 continue
 
+            signature = self.get_tree_signature(module_path)
             try:
-                fp, pathname, description = imp.find_module(name, [path])
-                try:
-                    module = Module(imp.load_module(name, fp, pathname, description))
-                finally:
-                    if fp:
-                        fp.close()
-            except Exception as e:
-                print >>sys.stderr, 'Unable to build module %s: [%s] %s' % (name, type(e).__name__, e)
+                cached_signature, m = cache[name]
+            except (KeyError, ValueError, TypeError):
+                m = None
             else:
-                m = ModuleInfo(module.name)
-                m.version = self.get_tree_mtime(module_path)
-                m.capabilities = list(set([c.__name__ for c in module.iter_caps()]))
-                m.description = module.description
-                m.maintainer = module.maintainer
-                m.license = module.license
-                m.icon = module.icon or ''
-                self.modules[module.name] = m
+                if cached_signature != signature:
+                    m = None
+
+            if m is None:
+                try:
+                    m = self.read_module_info(path, name)
+                    if m is None:
+                        m = self.load_module_info(path, name)
+                except Exception as e:
+                    print >>sys.stderr, 'Unable to build module %s: [%s] %s' % (name, type(e).__name__, e)
+                    continue
+                m.version = self.get_signature_mtime(signature)
+
+            new_cache[name] = (signature, m)
+            self.modules[m.name] = m
 
         self.update = int(datetime.now().strftime('%Y%m%d%H%M'))
         self.save(filename)
 
+        try:
+            with open(cache_filename, 'wb') as fp:
+                cPickle.dump({'capabilities': caps_signature, 'modules': new_cache}, fp, cPickle.HIGHEST_PROTOCOL)
+        except (IOError, cPickle.PicklingError) as e:
+            print >>sys.stderr, 'Unable to write index cache %s: %s' % (cache_filename, e)
+
+    @staticmethod
+    def load_module_info(path, name):
+        """
+        Get information about a module by importing it.
+
+        :param path: path of the repository
+        :type path: str
+        :param name: name of the module directory
+        :type name: str
+        :rtype: :class:`ModuleInfo`
+        """
+        fp, pathname, description = imp.find_module(name, [path])
+        try:
+            module = Module(imp.load_module(name, fp, pathname, description))
+        finally:
+            if fp:
+                fp.close()
+
+        m = ModuleInfo(module.name)
+        m.capabilities = list(set([c.__name__ for c in module.iter_caps()]))
+        m.description = module.description
+        m.maintainer = module.maintainer
+        m.license = module.license
+        m.icon = module.icon or ''
+        return m
+
+    @staticmethod
+    def read_module_info(path, name):
+        """
+        Get information about a module by reading its sources, without
+        importing it.
+
+        It only works when the backend class is defined in the __init__.py or
+        backend.py file, when its attributes are literal strings, and when
+        its capabilities are imported from weboob.
+
+        :param path: path of the repository
+        :type path: str
+        :param name: name of the module directory
+        :type name: str
+        :returns: the information, or None if it can't be read
+        :rtype: :class:`ModuleInfo`
+        """
+        for filename in ('__init__.py', 'backend.py'):
+            try:
+                with open(os.path.join(path, name, filename), 'r') as fp:
+                    tree = ast.parse(fp.read(), filename)
+            except IOError:
+                continue
+
+            imports = {}
+            klass = None
+            for node in tree.body:
+                if isinstance(node, ast.ImportFrom) and node.level == 0:
+                    for alias in node.names:
+                        imports[alias.asname or alias.name] = (node.module, alias.name)
+                elif isinstance(node, ast.ClassDef) and \
+                     any(isinstance(base, ast.Name) and base.id == 'BaseBackend' for base in node.bases):
+                    if klass is not None:
+                        return None
+                    klass = node
+
+            if klass is not None:
+                break
+        else:
+            return None
+
+        attrs = {}
+        for node in klass.body:
+            if isinstance(node, ast.Assign):
+                for target in node.targets:
+                    if isinstance(target, ast.Name):
+                        attrs[target.id] = node.value
+
+        values = {}
+        for attr in ('NAME', 'DESCRIPTION', 'MAINTAINER', 'EMAIL', 'LICENSE', 'ICON'):
+            if attr not in attrs:
+                values[attr] = getattr(BaseBackend, attr)
+            elif isinstance(attrs[attr], ast.Str):
+                values[attr] = attrs[attr].s
+            else:
+                return None
+
+        if not values['NAME']:
+            return None
+
+        caps = set()
+        for base in klass.bases:
+            if not isinstance(base, ast.Name):
+                # For example capabilities.bank.ICapBank.
+                return None
+            if base.id == 'BaseBackend':
+                continue
+            if base.id not in imports:
+                return None
+            modname, attrname = imports[base.id]
+            if not modname.startswith('weboob.capabilities'):
+                return None
+            cap = getattr(__import__(modname, fromlist=[attrname]), attrname, None)
+            if not isinstance(cap, type) or not issubclass(cap, IBaseCap):
+                return None
+
+            stack = [cap]
+            while stack:
+                cap = stack.pop()
+                if cap is not IBaseCap:
+                    caps.add(cap.__name__)
+                    stack.extend(b for b in cap.__bases__ if issubclass(b, IBaseCap))
+
+        m = ModuleInfo(values['NAME'])
+        m.capabilities = list(caps)
+        m.description = to_unicode(values['DESCRIPTION'])
+        m.maintainer = u'%s <%s>' % (to_unicode(values['MAINTAINER']), to_unicode(values['EMAIL']))
+        m.license = to_unicode(values['LICENSE'])
+        m.icon = values['ICON'] or ''
+        return m
+
+    @staticmethod
+    def get_tree_signature(path):
+        """
+        Get modification times and sizes of files of a tree, to know if it
+        has changed.
+        """
+        signature = []
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for f in sorted(files):
+                if f.endswith('.pyc'):
+                    continue
+                filepath = os.path.join(root, f)
+                st = os.stat(filepath)
+                signature.append((os.path.relpath(filepath, path), st.st_mtime, st.st_size))
+        return signature
+
+    @staticmethod
+    def get_signature_mtime(signature):
+        """
+        Get the same value than :func:`get_tree_mtime` from a signature got
+        with :func:`get_tree_signature`.
+        """
+        mtime = 0
+        for filepath, file_mtime, size in signature:
+            mtime = max(mtime, int(datetime.fromtimestamp(file_mtime).strftime('%Y%m%d%H%M')))
+        return mtime
+
     @staticmethod
     def get_tree_mtime(path, include_root=False):
         mtime = 0
@@ -343,6 +631,10 @@ class Repository(object):
         config.set(DEFAULTSECT, 'key_update', self.key_update)
         if private:
             config.set(DEFAULTSECT, 'url', self.url)
+            if self.etag:
+                config.set(DEFAULTSECT, 'etag', self.etag)
+            if self.last_modified:
+                config.set(DEFAULTSECT, 'last_modified', self.last_modified)
 
         for module in self.modules.itervalues():
             config.add_section(module.name)
@@ -419,6 +711,12 @@ class Repositories(object):
     REPOS_DIR = 'repositories'
     KEYRINGS_DIR = 'keyrings'
     ICONS_DIR = 'icons'
+    CACHE = 'repositories.cache'
+
+    UPDATE_CONCURRENCY = 4
+    """
+    Maximum number of modules downloaded at the same time by :func:`update`.
+    """
 
     SHARE_DIRS = [MODULES_DIR, REPOS_DIR, KEYRINGS_DIR, ICONS_DIR]
 
@@ -426,6 +724,8 @@ class Repositories(object):
         self.logger = getLogger('repositories')
         self.version = version
         WeboobBrowser.set_version(version)
+        RepositoryBrowser.set_version(version)
+        self.browser = None
 
         self.workdir = workdir
         self.datadir = datadir
@@ -434,6 +734,7 @@ class Repositories(object):
         self.repos_dir = os.path.join(self.datadir, self.REPOS_DIR)
         self.keyrings_dir = os.path.join(self.datadir, self.KEYRINGS_DIR)
         self.icons_dir = os.path.join(self.datadir, self.ICONS_DIR)
+        self.cache_path = os.path.join(self.datadir, self.CACHE)
 
         self.create_dir(self.datadir)
         self.create_dir(self.modules_dir)
@@ -444,6 +745,10 @@ class Repositories(object):
         self.versions = Versions(self.modules_dir)
 
         self.repositories = []
+        # Key of the cache and result of check_repositories() when the
+        # repositories were loaded from the cache.
+        self.cache_key = None
+        self.consistent = None
 
         if not os.path.exists(self.sources_list):
             with open(self.sources_list, 'w') as f:
@@ -458,6 +763,16 @@ class Repositories(object):
         elif not os.path.isdir(name):
             self.logger.error(u'"%s" is not a directory' % name)
 
+    def get_browser(self):
+        """
+        Get the browser used to download repositories and modules.
+
+        :rtype: :class:`RepositoryBrowser`
+        """
+        if self.browser is None:
+            self.browser = RepositoryBrowser()
+        return self.browser
+
     def _extend_module_info(self, repo, info):
         if repo.local:
             info.path = repo.localurl2path()
@@ -498,7 +813,14 @@ class Repositories(object):
     def load(self):
         """
         Load repositories from ~/.local/share/weboob/repositories/.
+
+        Parsed repositories are stored in a cache, which is used as long as
+        the sources.list and the repositories files are not modified.
         """
+        key = self.get_cache_key()
+        if self.load_cache(key):
+            return
+
         self.repositories = []
         for name in sorted(os.listdir(self.repos_dir)):
             path = os.path.join(self.repos_dir, name)
@@ -508,6 +830,66 @@ class Repositories(object):
             except RepositoryUnavailable as e:
                 print >>sys.stderr, 'Unable to load repository %s (%s), try to update repositories.' % (name, e)
 
+        self.save_cache(key)
+
+    def get_cache_key(self):
+        """
+        Get the key used to check if the cache is up to date, from the
+        version and the modification times and sizes of files it depends on.
+        """
+        key = [self.version]
+        paths = [self.sources_list] + [os.path.join(self.repos_dir, name) for name in sorted(os.listdir(self.repos_dir))]
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                key.append((path, None, None))
+            else:
+                key.append((path, st.st_mtime, st.st_size))
+        return key
+
+    def load_cache(self, key):
+        """
+        Load repositories from the cache.
+
+        :param key: current key of the cache
+        :returns: True if the cache is up to date and has been loaded
+        """
+        try:
+            with open(self.cache_path, 'rb') as fp:
+                cache_key, repositories, consistent = cPickle.load(fp)
+        except IOError:
+            return False
+        except Exception as e:
+            self.logger.debug(u'Unable to read cache %s: %s' % (self.cache_path, e))
+            return False
+
+        if cache_key != key:
+            return False
+
+        self.repositories = repositories
+        self.cache_key = key
+        self.consistent = consistent
+        return True
+
+    def save_cache(self, key):
+        """
+        Save loaded repositories in the cache.
+
+        :param key: current key of the cache
+        """
+        consistent = self._check_repositories()
+        tmp_path = '%s.%d' % (self.cache_path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as fp:
+                cPickle.dump((key, self.repositories, consistent), fp, cPickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, self.cache_path)
+        except (IOError, OSError, cPickle.PicklingError) as e:
+            self.logger.debug(u'Unable to write cache %s: %s' % (self.cache_path, e))
+        else:
+            self.cache_key = key
+            self.consistent = consistent
+
     def get_module_icon_path(self, module):
         return os.path.join(self.icons_dir, '%s.png' % module.name)
 
@@ -530,14 +912,13 @@ class Repositories(object):
             else:
                 icon_url = module.url.replace('.tar.gz', '.png')
 
-        browser = WeboobBrowser()
         try:
-            icon = browser.openurl(icon_url)
+            icon = self.get_browser().get(icon_url)
         except BrowserUnavailable:
             pass  # no icon, no problem
         else:
             with open(dest_path, 'wb') as fp:
-                fp.write(icon.read())
+                fp.write(icon.content)
 
     def _parse_source_list(self):
         l = []
@@ -558,9 +939,19 @@ class Repositories(object):
         :type progress: :class:`IProgress`
         """
         self.repositories = []
+
+        # Previous index files are kept until the end, as they are used when
+        # an index has not been modified.
+        previous = {}
         for name in os.listdir(self.repos_dir):
-            os.remove(os.path.join(self.repos_dir, name))
+            path = os.path.join(self.repos_dir, name)
+            try:
+                previous[Repository(path).url] = path
+            except Exception:
+                pass
 
+        saved = set()
+        browser = self.get_browser()
         gpgv = Keyring.find_gpgv()
         for line in self._parse_source_list():
             progress.progress(0.0, 'Getting %s' % line)
@@ -570,7 +961,8 @@ class Repositories(object):
             repo_path = os.path.join(self.repos_dir, prio_filename)
             keyring_path = os.path.join(self.keyrings_dir, filename)
             try:
-                repository.retrieve_index(repo_path)
+                repository.retrieve_index(repo_path, browser, previous.get(repository.url))
+                saved.add(prio_filename)
                 if gpgv:
                     repository.retrieve_keyring(keyring_path)
                 else:
@@ -581,10 +973,19 @@ class Repositories(object):
             else:
                 self.repositories.append(repository)
 
+        for name in os.listdir(self.repos_dir):
+            if name not in saved:
+                os.remove(os.path.join(self.repos_dir, name))
+
     def check_repositories(self):
         """
         Check if sources.list is consistent with repositories
         """
+        if self.cache_key is not None and self.cache_key == self.get_cache_key():
+            return self.consistent
+        return self._check_repositories()
+
+    def _check_repositories(self):
         l = []
         for line in self._parse_source_list():
             repository = Repository(line)
@@ -617,12 +1018,54 @@ class Repositories(object):
             def progress(self, percent, message):
                 progress.progress(float(self.n)/len(to_update) + 1.0/len(to_update)*percent, message)
 
-        for n, info in enumerate(to_update):
-            inst_progress = InstallProgress(n)
+        class FetchProgress(IProgress):
+            # Progress of a download, reported later by this thread, as
+            # the observer may not be thread-safe (for example Qt widgets).
+            def __init__(self):
+                self.messages = []
+
+            def progress(self, percent, message):
+                self.messages.append((percent, message))
+
+        # Indexes of modules which are downloaded.
+        fetched = Queue()
+
+        def fetch(n, info, fetch_progress):
             try:
-                self.install(info, inst_progress)
-            except ModuleInstallError as e:
-                inst_progress.progress(1.0, unicode(e))
+                return self._fetch_module(info, fetch_progress)
+            finally:
+                fetched.put(n)
+
+        # Modules are downloaded and checked by a pool of threads, and
+        # installed one after another in this thread, as soon as they are
+        # downloaded.
+        workers = WorkerPool(self.UPDATE_CONCURRENCY)
+        try:
+            jobs = {}
+            for n, info in enumerate(to_update):
+                inst_progress = InstallProgress(n)
+                try:
+                    self._check_install(info, inst_progress)
+                except ModuleInstallError as e:
+                    inst_progress.progress(1.0, unicode(e))
+                else:
+                    fetch_progress = FetchProgress()
+                    jobs[n] = (workers.submit(None, fetch, n, info, fetch_progress), fetch_progress)
+
+            for i in xrange(len(jobs)):
+                n = fetched.get()
+                job, fetch_progress = jobs[n]
+                job.wait()
+                inst_progress = InstallProgress(n)
+                for percent, message in fetch_progress.messages:
+                    inst_progress.progress(percent, message)
+                try:
+                    job.raise_error()
+                    self._setup_module(to_update[n], job.result, inst_progress)
+                except ModuleInstallError as e:
+                    inst_progress.progress(1.0, unicode(e))
+        finally:
+            workers.stop()
 
     def install(self, module, progress=IProgress()):
         """
@@ -645,6 +1088,11 @@ class Repositories(object):
 
         module = info
 
+        self._check_install(module, progress)
+        fp = self._fetch_module(module, progress)
+        self._setup_module(module, fp, progress)
+
+    def _check_install(self, module, progress):
         if module.is_local():
             raise ModuleInstallError('%s is available on local.' % module.name)
 
@@ -657,30 +1105,57 @@ class Repositories(object):
         else:
             raise ModuleInstallError('The latest version of %s is already installed' % module.name)
 
-        browser = WeboobBrowser()
+    def _fetch_module(self, module, progress):
+        """
+        Download a module and check its signature.
+
+        It can be called by several threads at the same time.
+
+        :returns: the downloaded tarball
+        :rtype: :class:`tempfile.NamedTemporaryFile`
+        """
+        browser = self.get_browser()
         progress.progress(0.2, 'Downloading module...')
+        fp = NamedTemporaryFile(suffix='.tar.gz')
         try:
-            tardata = browser.readurl(module.url)
-        except BrowserUnavailable as e:
-            raise ModuleInstallError('Unable to fetch module: %s' % e)
-
-        # Check signature
-        if module.signed and Keyring.find_gpgv():
-            progress.progress(0.5, 'Checking module authenticity...')
-            sig_data = browser.readurl(posixpath.join(module.url + '.sig'))
-            keyring_path = os.path.join(self.keyrings_dir, self.url2filename(module.repo_url))
-            keyring = Keyring(keyring_path)
-            if not keyring.exists():
-                raise ModuleInstallError('No keyring found, please update repos.')
-            if not keyring.is_valid(tardata, sig_data):
-                raise ModuleInstallError('Invalid signature for %s.' % module.name)
+            try:
+                browser.download(module.url, fp)
+            except BrowserUnavailable as e:
+                raise ModuleInstallError('Unable to fetch module: %s' % e)
+            fp.flush()
+            fp.seek(0)
+
+            # Check signature
+            if module.signed and Keyring.find_gpgv():
+                progress.progress(0.5, 'Checking module authenticity...')
+                try:
+                    sig_data = browser.get(posixpath.join(module.url + '.sig')).content
+                except BrowserUnavailable as e:
+                    raise ModuleInstallError('Unable to fetch signature: %s' % e)
+                keyring_path = os.path.join(self.keyrings_dir, self.url2filename(module.repo_url))
+                keyring = Keyring(keyring_path)
+                if not keyring.exists():
+                    raise ModuleInstallError('No keyring found, please update repos.')
+                if not keyring.is_valid(fp, sig_data):
+                    raise ModuleInstallError('Invalid signature for %s.' % module.name)
+        except Exception:
+            fp.close()
+            raise
+        return fp
+
+    def _setup_module(self, module, fp, progress):
+        """
+        Extract a module downloaded by :func:`_fetch_module`.
+        """
+        module_dir = os.path.join(self.modules_dir, module.name)
 
         # Extract module from tarball.
         if os.path.isdir(module_dir):
             shutil.rmtree(module_dir)
         progress.progress(0.7, 'Setting up module...')
-        with closing(tarfile.open('', 'r:gz', StringIO(tardata))) as tar:
-            tar.extractall(self.modules_dir)
+        with closing(fp):
+            with closing(tarfile.open(fileobj=fp, mode='r:gz')) as tar:
+                tar.extractall(self.modules_dir)
         if not os.path.isdir(module_dir):
             raise ModuleInstallError('The archive for %s looks invalid.' % module.name)
         # Precompile
@@ -758,19 +1233,23 @@ class Keyring(object):
     def is_valid(self, data, sigdata):
         """
         Check if the data is signed by an accepted key.
-        data and sigdata should be strings.
+        sigdata should be a string, and data a string or a file.
         """
         gpgv = self.find_gpgv()
         with NamedTemporaryFile(suffix='.sig') as sigfile:
             sigfile.write(sigdata)
             sigfile.flush()  # very important
-            assert isinstance(data, basestring)
+            if isinstance(data, basestring):
+                datapath = '-'
+            else:
+                datapath = os.path.realpath(data.name)
+                data = None
             # Yes, all of it is necessary
             proc = subprocess.Popen([gpgv,
                     '--status-fd', '1',
                     '--keyring', os.path.realpath(self.path),
                     os.path.realpath(sigfile.name),
-                    '-'],
+                    datapath],
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE)
@@ -20,12 +20,17 @@
 
 
 
-from threading import Timer, Event, RLock, _Timer
+from heapq import heappush, heappop
+from random import uniform
+from threading import Thread, Timer, Event, RLock, Condition, _Timer
+from time import time
+
+from weboob.core.workers import WorkerPool
 from weboob.tools.log import getLogger
 from weboob.tools.misc import get_backtrace
 
 
-__all__ = ['Scheduler']
+__all__ = ['Scheduler', 'HeapScheduler']
 
 
 class IScheduler(object):
@@ -135,3 +140,177 @@ class Scheduler(IScheduler):
                 # Contrary to _wait_to_stop(), don't call t.join
                 # because want_stop() have to be non-blocking.
             self.queue = {}
+
+
+class HeapEvent(object):
+    def __init__(self, id, interval, function, args):
+        self.id = id
+        self.interval = interval
+        self.function = function
+        self.args = args
+        self.due = None
+
+
+class HeapScheduler(IScheduler):
+    """
+    Scheduler which keeps events in a heap, ordered by due time. Only one
+    thread waits for the next due event, and functions are called by a
+    pool of threads.
+
+    A repeated function is called again *interval* seconds after the end of
+    the previous call, so calls never overlap, and calls missed while the
+    pool is busy are merged into one.
+
+    The thread sleeps without timeout while there is no event. Note that on
+    Python 2, waiting with a timeout is done by sleeping up to 50ms at a
+    time, so the thread still wakes up regularly until the next due event.
+
+    :param workers: pool of threads calling functions; by default, a new
+                    :class:`weboob.core.workers.WorkerPool` of *size* threads
+    :type workers: :class:`weboob.core.workers.WorkerPool`
+    :param size: number of threads of the default pool
+    :type size: :class:`int`
+    :param jitter: maximum number of seconds randomly added to delays, to
+                   avoid calling many functions at the same time
+    :type jitter: :class:`float`
+    """
+    def __init__(self, workers=None, size=5, jitter=0):
+        self.logger = getLogger('scheduler')
+        self.mutex = RLock()
+        # Notified when the next due event may have changed
+        self.wakeup = Condition(self.mutex)
+        self.stop_event = Event()
+        self.count = 0
+        self.heap = []
+        self.events = {}
+        self.jitter = jitter
+        if workers is None:
+            workers = WorkerPool(size)
+        self.workers = workers
+        self.thread = None
+
+    def schedule(self, interval, function, *args):
+        return self._schedule(interval, None, function, args)
+
+    def repeat(self, interval, function, *args):
+        # As RepeatedTimer, the first call is immediate.
+        return self._schedule(0, interval, function, args)
+
+    def _schedule(self, delay, interval, function, args):
+        if self.stop_event.isSet():
+            return
+
+        with self.mutex:
+            self.count += 1
+            event = HeapEvent(self.count, interval, function, args)
+            self.events[event.id] = event
+            self._push(event, delay)
+
+            if self.thread is None:
+                self.thread = Thread(target=self._dispatch, name='weboob-scheduler')
+                self.thread.setDaemon(True)
+                self.thread.start()
+            return event.id
+
+    def _push(self, event, delay):
+        if self.jitter:
+            delay += uniform(0, self.jitter)
+        event.due = time() + delay
+        heappush(self.heap, (event.due, event.id, event))
+        self.wakeup.notify()
+        self.logger.debug('function "%s" will be called in %s seconds' % (event.function.__name__, delay))
+
+    def _dispatch(self):
+        while True:
+            with self.mutex:
+                due_events = self._pop_due()
+                if due_events is None:
+                    self.thread = None
+                    return
+
+            # submit() may block when the queue of the pool is full, so it
+            # is called without holding the mutex.
+            for event in due_events:
+                self.workers.submit(None, self._call, event)
+
+    def _pop_due(self):
+        """
+        Wait for events to be due, and take them from the heap.
+
+        :returns: the due events, or None if the scheduler is stopped
+        """
+        due_events = []
+        while not self.stop_event.isSet():
+            if not self.heap:
+                if due_events:
+                    return due_events
+                self.wakeup.wait()
+                continue
+
+            due, id, event = self.heap[0]
+            if self.events.get(id) is not event:
+                # canceled
+                heappop(self.heap)
+                continue
+
+            now = time()
+            if due > now:
+                if due_events:
+                    return due_events
+                self.wakeup.wait(due - now)
+                continue
+
+            heappop(self.heap)
+            if event.interval is None:
+                self.events.pop(id)
+            due_events.append(event)
+        return None
+
+    def _call(self, event):
+        try:
+            event.function(*event.args)
+        except Exception:
+            # do not stop repeated calls because of an exception
+            self.logger.error(get_backtrace())
+
+        if event.interval is None:
+            return
+
+        with self.mutex:
+            if not self.stop_event.isSet() and self.events.get(event.id) is event:
+                self._push(event, event.interval)
+
+    def cancel(self, ev):
+        with self.mutex:
+            try:
+                e = self.events.pop(ev)
+            except KeyError:
+                return False
+            # It is removed from the heap when it is due.
+            self.wakeup.notify()
+            self.logger.debug('scheduled function "%s" is canceled' % e.function.__name__)
+            return True
+
+    def _wait_to_stop(self):
+        self.want_stop()
+        self.workers.stop()
+
+    def run(self):
+        try:
+            while not self.stop_event.isSet():
+                # On Python 2, a wait without timeout can not be interrupted
+                # by KeyboardInterrupt.
+                self.stop_event.wait(1)
+        except KeyboardInterrupt:
+            self._wait_to_stop()
+            raise
+        else:
+            self._wait_to_stop()
+        return True
+
+    def want_stop(self):
+        self.stop_event.set()
+        with self.mutex:
+            self.events = {}
+            self.heap = []
+            self.wakeup.notify()
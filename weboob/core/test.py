@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+from threading import Event
+
+from weboob.core.bcall import CallErrors, CallTimeout
+from weboob.core.ouiboube import WebNip
+from weboob.core.workers import WorkerPool
+from weboob.tools.backend import BaseBackend
+
+
+def test_max_per_key():
+    pool = WorkerPool(4, max_per_key=1)
+    running = []
+    concurrent = []
+
+    def call():
+        running.append(None)
+        concurrent.append(len(running))
+        Event().wait(0.01)
+        running.pop()
+
+    jobs = [pool.submit('key', call) for i in xrange(4)]
+    for job in jobs:
+        assert job.wait(10)
+    assert concurrent == [1, 1, 1, 1]
+    pool.stop()
+
+
+def test_nested_submit():
+    # A job waiting for a job with the same key must not wait for itself.
+    pool = WorkerPool(4, max_per_key=1)
+
+    def outer():
+        jobs = [pool.submit('key', lambda n=n: n * 2) for n in xrange(3)]
+        with pool.blocking():
+            for job in jobs:
+                assert job.wait(10)
+        return [job.result for job in jobs]
+
+    job = pool.submit('key', outer)
+    assert job.wait(10)
+    job.raise_error()
+    assert job.result == [0, 2, 4]
+    pool.stop()
+
+
+class FillBackend(BaseBackend):
+    NAME = 'fill'
+    FILLOBJ_CONCURRENCY = 2
+
+    def fillobj(self, obj, fields=None):
+        return obj * 2
+
+
+def test_fillobj_many_max_per_key():
+    # Objects are filled by jobs with the key of the calling job.
+    weboob = WebNip(modules_path=False, workers=WorkerPool(4, max_per_key=1))
+    weboob.backend_instances['fill'] = FillBackend(weboob, 'fill', {})
+    try:
+        results = [result for backend, result in weboob.do('fillobj_many', [1, 2, 3, 4], timeout=10)]
+        assert results == [2, 4, 6, 8]
+    finally:
+        weboob.deinit()
+
+
+class PoolBackend(BaseBackend):
+    NAME = 'pool'
+    FILLOBJ_CONCURRENCY = 2
+    CONCURRENT_CALLS = 2
+
+    def create_default_browser(self):
+        return object()
+
+    def fillobj(self, obj, fields=None):
+        return self.browser
+
+    def fill_browsers(self, objs):
+        return self.browser, self.fillobj_many(objs)
+
+
+def test_fillobj_many_browser():
+    # The default browser is lent to a call, so the next call gets another
+    # one, which must also be used to fill its objects.
+    weboob = WebNip(modules_path=False)
+    backend = weboob.backend_instances['pool'] = PoolBackend(weboob, 'pool', {})
+    try:
+        with backend:
+            default = backend.browser
+            results = [result for b, result in weboob.do('fill_browsers', range(4), timeout=10)]
+        browser, filled = results
+        assert browser is not default
+        assert filled == [browser] * 4
+    finally:
+        weboob.deinit()
+
+
+class SlowBackend(BaseBackend):
+    NAME = 'slow'
+
+    def __init__(self, weboob, name, config, release):
+        BaseBackend.__init__(self, weboob, name, config)
+        self.release = release
+
+    def iter_results(self, hang):
+        yield self.name
+        if hang:
+            self.release.wait(10)
+            yield 'late'
+
+
+def test_timeout():
+    # Results received in time are returned, and late backends are reported.
+    release = Event()
+    weboob = WebNip(modules_path=False)
+    for name in ('fast', 'hung'):
+        weboob.backend_instances[name] = SlowBackend(weboob, name, {}, release)
+    results = []
+    try:
+        try:
+            for backend, result in weboob.do(lambda backend: backend.iter_results(backend.name == 'hung'),
+                                             per_backend_timeout=0.2):
+                results.append(result)
+        except CallErrors as e:
+            errors = [(backend.name, type(error)) for backend, error, backtrace in e.errors]
+        else:
+            assert False, 'CallErrors not raised'
+        assert sorted(results) == ['fast', 'hung']
+        assert errors == [('hung', CallTimeout)]
+    finally:
+        release.set()
+        weboob.deinit()
+
+
+def test_timeout_pool():
+    # Late backends keep running, but do not prevent other calls from using
+    # the pool.
+    release = Event()
+    weboob = WebNip(modules_path=False, workers=WorkerPool(1))
+    for name in ('hung', 'fast'):
+        weboob.backend_instances[name] = SlowBackend(weboob, name, {}, release)
+    try:
+        try:
+            list(weboob.do('iter_results', True, backends='hung', timeout=0.2))
+        except CallErrors as e:
+            assert [type(error) for backend, error, backtrace in e.errors] == [CallTimeout]
+        else:
+            assert False, 'CallErrors not raised'
+        results = [result for backend, result in weboob.do('iter_results', False, backends='fast', timeout=5)]
+        assert results == ['fast']
+    finally:
+        release.set()
+        weboob.deinit()
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2013 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from collections import deque
+import sys
+from contextlib import contextmanager
+from threading import Thread, Event, RLock, Condition, local, currentThread
+from time import time
+
+from weboob.tools.misc import get_backtrace
+from weboob.tools.log import getLogger
+
+
+__all__ = ['WorkerPool', 'Job']
+
+
+class Job(object):
+    """
+    A function call submitted to a :class:`WorkerPool`.
+
+    :param key: key used to limit concurrency (for example a module name)
+    :param function: function to call
+    :param args: arguments to give to function
+    :param kwargs: keyword arguments to give to function
+    """
+    def __init__(self, key, function, args, kwargs):
+        self.key = key
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self.backtrace = None
+        # Type, value and traceback of the error, as returned by sys.exc_info()
+        self.exc_info = None
+        self.finished = Event()
+        # Set by the pool when a thread starts to run the job
+        self.started = False
+        # Set when the job is not counted in the pool size anymore
+        self.abandoned = False
+
+    def run(self):
+        try:
+            self.result = self.function(*self.args, **self.kwargs)
+        except Exception as e:
+            self.error = e
+            self.exc_info = sys.exc_info()
+            self.backtrace = get_backtrace(e)
+        finally:
+            self.finished.set()
+
+    def raise_error(self):
+        """
+        Raise again the error of the job, if any, with the traceback of the
+        thread which ran it.
+        """
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+
+    def wait(self, timeout=None):
+        """
+        Wait for the job to be finished.
+
+        :param timeout: if specified, maximum number of seconds to wait
+        :type timeout: :class:`float`
+        :returns: True if the job is finished
+        """
+        self.finished.wait(timeout)
+        return self.finished.isSet()
+
+
+class WorkerPool(object):
+    """
+    Pool of threads to run jobs, used for example by
+    :class:`weboob.core.bcall.BackendsCall` to call backends.
+
+    Threads are started on demand, and they are kept to be reused by next
+    jobs.
+
+    :param size: maximum number of jobs running at the same time
+    :type size: :class:`int`
+    :param max_per_key: if specified, maximum number of jobs with the same
+                        key running at the same time; jobs submitted by a
+                        job of the pool are not limited, as they may be
+                        waited by a job holding the key
+    :type max_per_key: :class:`int`
+    :param queue_size: if specified, maximum number of pending jobs;
+                       :func:`submit` blocks when it is reached
+    :type queue_size: :class:`int`
+    """
+    DEFAULT_SIZE = 20
+
+    def __init__(self, size=DEFAULT_SIZE, max_per_key=None, queue_size=None):
+        assert size > 0
+        self.logger = getLogger('workers')
+        self.size = size
+        self.max_per_key = max_per_key
+        self.queue_size = queue_size
+
+        self.mutex = RLock()
+        # Notified when a job is ready to run, or when threads have to stop
+        self.job_ready = Condition(self.mutex)
+        # Notified when a pending job leaves the queue
+        self.job_taken = Condition(self.mutex)
+
+        # Jobs ready to be run by a thread
+        self.ready = deque()
+        # Jobs waiting because there are too many running jobs with their key
+        self.deferred = {}
+        # Number of ready or running jobs for each key
+        self.dispatched = {}
+        # Number of ready or deferred jobs
+        self.pending = 0
+
+        self.threads = set()
+        # Number of threads waiting for a job
+        self.idle = 0
+        # Number of threads running a job which is blocked on something else
+        self.blocked = 0
+        self.stopping = False
+        self.local = local()
+
+    def in_worker(self):
+        """
+        Return True if the current thread is one of this pool.
+        """
+        return getattr(self.local, 'worker', False)
+
+    def submit(self, key, function, *args, **kwargs):
+        """
+        Submit a function to be called by a thread of the pool.
+
+        :param key: key used to limit concurrency with the *max_per_key*
+                    parameter (for example a module name)
+        :param function: function to call
+        :type function: callable
+        :param args: arguments to give to function
+        :param kwargs: keyword arguments to give to function
+        :rtype: :class:`Job`
+        """
+        job = Job(key, function, args, kwargs)
+        in_worker = self.in_worker()
+        with self.mutex:
+            # A worker which waits for a slot might wait for itself.
+            if self.queue_size and not in_worker:
+                while self.pending >= self.queue_size:
+                    self.job_taken.wait()
+
+            self.pending += 1
+            if self.max_per_key and not in_worker and self.dispatched.get(key, 0) >= self.max_per_key:
+                self.deferred.setdefault(key, deque()).append(job)
+            else:
+                self._dispatch(job)
+        return job
+
+    @contextmanager
+    def blocking(self):
+        """
+        Context manager to use in a job when it waits for something which
+        may depend on other jobs of this pool (for example results of
+        another call).
+
+        While it is blocked, the job does not count in the pool size, so an
+        other thread can be started to run pending jobs.
+        """
+        if not self.in_worker():
+            yield
+            return
+
+        with self.mutex:
+            self.blocked += 1
+            self._spawn()
+        try:
+            yield
+        finally:
+            with self.mutex:
+                self.blocked -= 1
+
+    def abandon(self, job):
+        """
+        Stop counting a running job in the pool size, for example when it
+        is timed out and its result is not waited anymore, so an other
+        thread can be started to run pending jobs.
+
+        :param job: job returned by :func:`submit`
+        :type job: :class:`Job`
+        """
+        with self.mutex:
+            if job.started and not job.finished.isSet() and not job.abandoned:
+                job.abandoned = True
+                self.blocked += 1
+                self._spawn()
+
+    def stop(self, timeout=None):
+        """
+        Wait for the running jobs to be finished, and stop every threads.
+
+        The pool is still usable after this call, as new threads are started
+        on demand.
+
+        :param timeout: if specified, maximum number of seconds to wait; as
+                        threads are daemons, jobs still running then do not
+                        prevent the process from exiting
+        :type timeout: :class:`float`
+        :returns: True if every threads are stopped
+        """
+        with self.mutex:
+            self.stopping = True
+            self.job_ready.notifyAll()
+            threads = [thread for thread in self.threads if thread is not currentThread()]
+
+        deadline = time() + timeout if timeout is not None else None
+        for thread in threads:
+            if deadline is None:
+                thread.join()
+            else:
+                thread.join(max(deadline - time(), 0))
+
+        with self.mutex:
+            self.stopping = False
+        return not any(thread.isAlive() for thread in threads)
+
+    def _dispatch(self, job):
+        self.dispatched[job.key] = self.dispatched.get(job.key, 0) + 1
+        self.ready.append(job)
+        self.job_ready.notify()
+        self._spawn()
+
+    def _spawn(self):
+        if len(self.ready) <= self.idle or len(self.threads) - self.blocked >= self.size:
+            return
+
+        thread = Thread(target=self._run, name='weboob-worker')
+        thread.setDaemon(True)
+        self.threads.add(thread)
+        thread.start()
+
+    def _done(self, job):
+        self.dispatched[job.key] -= 1
+        if self.dispatched[job.key] == 0:
+            self.dispatched.pop(job.key)
+
+        deferred = self.deferred.get(job.key)
+        if deferred:
+            self._dispatch(deferred.popleft())
+            if not deferred:
+                self.deferred.pop(job.key)
+
+    def _run(self):
+        self.local.worker = True
+        with self.mutex:
+            try:
+                while True:
+                    while not self.ready and not self.stopping:
+                        self.idle += 1
+                        self.job_ready.wait()
+                        self.idle -= 1
+
+                    # Threads started while other jobs were blocked are
+                    # exceeding the pool size.
+                    if not self.ready or len(self.threads) - self.blocked > self.size:
+                        return
+
+                    job = self.ready.popleft()
+                    job.started = True
+                    self.pending -= 1
+                    self.job_taken.notify()
+
+                    self.mutex.release()
+                    try:
+                        job.run()
+                        if job.error is not None:
+                            self.logger.debug('Job %r raised an error: %r' % (job.function, job.error))
+                    finally:
+                        self.mutex.acquire()
+                        if job.abandoned:
+                            self.blocked -= 1
+                        self._done(job)
+            finally:
+                self.threads.discard(currentThread())
+                # An other thread may have to take the remaining jobs.
+                if self.ready:
+                    self.job_ready.notify()
+                    self._spawn()
@@ -30,6 +30,7 @@ from weboob.capabilities.base import ConversionWarning
 from weboob.tools.browser.browser import FormFieldConversionWarning
 from weboob.core import Weboob, CallErrors
 from weboob.core.backendscfg import BackendsConfig
+from weboob.tools.backend import BaseBackend
 from weboob.tools.config.iconfig import ConfigError
 from weboob.tools.log import createColoredFormatter, getLogger
 from weboob.tools.misc import to_unicode
@@ -97,6 +98,9 @@ class BaseApplication(object):
     VERSION = None
     # Copyright
     COPYRIGHT = None
+    # Maximum number of results given at once to fillobj_many() when they
+    # are completed
+    FILL_BATCH_SIZE = 20
 
     # ------ Abstract methods --------------------------------------
     def create_weboob(self):
@@ -153,6 +157,7 @@ class BaseApplication(object):
         self._parser.add_option('-b', '--backends', help='what backend(s) to enable (comma separated)')
         self._parser.add_option('-e', '--exclude-backends', help='what backend(s) to exclude (comma separated)')
         self._parser.add_option('-I', '--insecure', action='store_true', help='do not validate SSL')
+        self._parser.add_option('--lazy-backends', action='store_true', help='build backends only when they are used')
         logging_options = OptionGroup(self._parser, 'Logging Options')
         logging_options.add_option('-d', '--debug', action='store_true', help='display debug messages')
         logging_options.add_option('-q', '--quiet', action='store_true', help='display only error messages')
@@ -172,7 +177,11 @@ class BaseApplication(object):
 
         :param path: An optional specific path
         :type path: :class:`str`
-        :param klass: What class to instance
+        :param klass: What class to instance; default is
+                      :class:`weboob.tools.storage.StandardStorage`;
+                      :class:`weboob.tools.storage.ShardedStorage` and
+                      :class:`weboob.tools.storage.SQLiteStorage` are
+                      faster to save, but they store data elsewhere
         :type klass: :class:`weboob.tools.storage.IStorage`
         :param localonly: If True, do not set it on the :class:`Weboob` object.
         :type localonly: :class:`bool`
@@ -231,6 +240,9 @@ class BaseApplication(object):
             names = self.options.backends.split(',')
         if exclude is None and self.options.exclude_backends:
             exclude = self.options.exclude_backends.split(',')
+        if self.options.lazy_backends:
+            # Configuration errors are then raised by calls to backends.
+            kwargs.setdefault('lazy', True)
         loaded = self.weboob.load_backends(caps, names, exclude=exclude, *args, **kwargs)
         if not loaded:
             logging.info(u'No backend loaded')
@@ -250,16 +262,50 @@ class BaseApplication(object):
             backend.fillobj(obj, fields)
         return obj
 
+    def _do_complete_many(self, backend, fields, objs):
+        if fields is None or len(fields) > 0:
+            return backend.fillobj_many(objs, fields)
+        return objs
+
+    def _get_fill_batch_size(self, backend, fields):
+        if fields is not None and len(fields) == 0:
+            # Nothing to fill, do not delay results.
+            return 1
+        if backend.FILLOBJ_CONCURRENCY <= 1 and \
+           getattr(backend.fillobj_many, 'im_func', None) is BaseBackend.fillobj_many.im_func:
+            # Objects are filled one by one anyway.
+            return 1
+        return self.FILL_BATCH_SIZE
+
     def _do_complete_iter(self, backend, count, fields, res):
+        batch_size = self._get_fill_batch_size(backend, fields)
         modif = 0
-        for i, sub in enumerate(res):
-            if self.condition and not self.condition.is_valid(sub):
-                modif += 1
-            else:
+        batch = []
+        more = False
+        try:
+            for i, sub in enumerate(res):
+                if self.condition and not self.condition.is_valid(sub):
+                    modif += 1
+                    continue
                 if count and i - modif == count:
-                    raise MoreResultsAvailable()
-                sub = self._do_complete_obj(backend, fields, sub)
-                yield sub
+                    more = True
+                    break
+                batch.append(sub)
+                if len(batch) >= batch_size:
+                    todo, batch = batch, []
+                    for obj in self._do_complete_many(backend, fields, todo):
+                        yield obj
+        except Exception:
+            # Give the results received before the error.
+            exc_info = sys.exc_info()
+            for obj in self._do_complete_many(backend, fields, batch):
+                yield obj
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+        for obj in self._do_complete_many(backend, fields, batch):
+            yield obj
+        if more:
+            raise MoreResultsAvailable()
 
     def _do_complete(self, backend, count, selected_fields, function, *args, **kwargs):
         assert count is None or count > 0
@@ -34,6 +34,7 @@ from weboob.capabilities.account import ICapAccount, Account, AccountRegisterErr
 from weboob.core.backendscfg import BackendAlreadyExists
 from weboob.core.modules import ModuleLoadError
 from weboob.core.repositories import ModuleInstallError
+from weboob.tools.backend import BaseBackend
 from weboob.tools.browser import BrowserUnavailable, BrowserIncorrectPassword, BrowserForbidden
 from weboob.tools.value import Value, ValueBool, ValueFloat, ValueInt, ValueBackendPassword
 from weboob.tools.misc import to_unicode
@@ -540,6 +541,15 @@ class ConsoleApplication(BaseApplication):
             print >>sys.stderr, u'Error(%s): this feature is not supported yet by this backend.' % backend.name
             print >>sys.stderr, u'      %s   To help the maintainer of this backend implement this feature,' % (' ' * len(backend.name))
             print >>sys.stderr, u'      %s   please contact: %s <%s@issues.weboob.org>' % (' ' * len(backend.name), backend.MAINTAINER, backend.NAME)
+        elif isinstance(error, BaseBackend.ConfigError):
+            # Raised on first use of backends loaded with --lazy-backends.
+            print >>sys.stderr, u'Error(%s): %s' % (backend.name, to_unicode(error))
+            if self.ask('Do you want to reconfigure this backend?', default=True):
+                self.unload_backends(names=[backend.name])
+                self.edit_backend(backend.name)
+                self.load_backends(names=[backend.name])
+        elif isinstance(error, ModuleLoadError):
+            print >>sys.stderr, u'Error(%s): unable to load module: %s' % (backend.name, to_unicode(error))
         elif isinstance(error, UserError):
             print >>sys.stderr, u'Error(%s): %s' % (backend.name, to_unicode(error))
         elif isinstance(error, MoreResultsAvailable):
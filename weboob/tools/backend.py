@@ -19,12 +19,14 @@
 
 
 import os
-from threading import RLock
+from contextlib import contextmanager
+from threading import RLock, BoundedSemaphore, local
 from copy import copy
 
 from weboob.capabilities.base import CapBaseObject, FieldNotFound, \
     IBaseCap, NotLoaded, NotAvailable
 from weboob.tools.misc import iter_fields
+from weboob.tools.ordereddict import OrderedDict
 from weboob.tools.log import getLogger
 from weboob.tools.value import ValuesDict
 
@@ -130,6 +132,8 @@ class BackendConfig(ValuesDict):
     modname = None
     instname = None
     weboob = None
+    # Parameters the configuration has been loaded from
+    params = None
 
     def load(self, weboob, modname, instname, config, nofail=False):
         """
@@ -151,6 +155,7 @@ class BackendConfig(ValuesDict):
         cfg.modname = modname
         cfg.instname = instname
         cfg.weboob = weboob
+        cfg.params = config
         for name, field in self.iteritems():
             value = config.get(name, None)
 
@@ -212,7 +217,8 @@ class BaseBackend(object):
     :type weboob: :class:`weboob.core.ouiboube.Weboob`
     :param name: name of backend
     :type name: :class:`str`
-    :param config: configuration of backend
+    :param config: configuration of backend, or a configuration already
+                   loaded with :func:`BackendConfig.load`
     :type config: :class:`dict`
     :param storage: storage object
     :type storage: :class:`weboob.tools.storage.IStorage`
@@ -238,6 +244,11 @@ class BaseBackend(object):
     STORAGE = {}
     # Browser class
     BROWSER = None
+    # If True, the state of the browser (its cookies) is saved in storage
+    # when the backend is unloaded, and given to the next browser built by
+    # create_browser() in the 'state' parameter, to reuse the session on
+    # website instead of login again.
+    SAVE_BROWSER_STATE = False
     # URL to an optional icon.
     # If you want to create your own icon, create a 'favicon.ico' ico in
     # the module's directory, and keep the ICON value to None.
@@ -248,6 +259,17 @@ class BaseBackend(object):
     # When the method is called, fields are only the one which are
     # NOT yet filled.
     OBJECTS = {}
+    # Maximum number of objects filled at the same time by fillobj_many().
+    # fillobj() must be thread-safe to increase it, including its use of the
+    # browser, which is shared by the objects filled in a call.
+    FILLOBJ_CONCURRENCY = 1
+    # Maximum number of calls run at the same time on this backend. To
+    # increase it, the backend must be thread-safe, except its browser: each
+    # call uses its own one, taken from a pool of browsers.
+    CONCURRENT_CALLS = 1
+    # If True, the browsers of the pool are built with the state (cookies)
+    # of the default browser, to share the session on website.
+    SHARE_BROWSER_STATE = False
 
     class ConfigError(Exception):
         """
@@ -255,10 +277,96 @@ class BaseBackend(object):
         """
 
     def __enter__(self):
-        self.lock.acquire()
+        if self.CONCURRENT_CALLS <= 1:
+            self.lock.acquire()
+            return
+
+        # Nested blocks of a thread are the same call.
+        calls = getattr(self._local, 'calls', 0)
+        if calls == 0:
+            # A thread with exclusive access already holds every slot.
+            self._local.slot = not getattr(self._local, 'exclusive', 0)
+            if self._local.slot:
+                self._calls.acquire()
+            self._local.browser = None
+        self._local.calls = calls + 1
 
     def __exit__(self, t, v, tb):
-        self.lock.release()
+        if self.CONCURRENT_CALLS <= 1:
+            self.lock.release()
+            return
+
+        self._local.calls -= 1
+        if self._local.calls == 0:
+            browser, self._local.browser = self._local.browser, None
+            if browser is not None:
+                with self._pool_lock:
+                    self._idle_browsers.append(browser)
+            if self._local.slot:
+                self._calls.release()
+
+    def acquire_exclusive(self, blocking=True):
+        """
+        Wait for the running calls to be finished, and prevent other threads
+        from calling the backend until :func:`release_exclusive` is called.
+
+        It is the same than ``with backend:`` if ``CONCURRENT_CALLS`` is 1.
+
+        :param blocking: if False, do not wait if the backend is busy
+        :type blocking: bool
+        :returns: True if the exclusive access is acquired
+        :rtype: bool
+        """
+        if self.CONCURRENT_CALLS <= 1:
+            return self.lock.acquire(blocking)
+
+        if getattr(self._local, 'exclusive', 0):
+            self._local.exclusive += 1
+            return True
+
+        # Only one thread at a time takes slots of calls, so two threads do
+        # not wait for slots taken by each other.
+        if not self.lock.acquire(blocking):
+            return False
+        # A call of this thread already holds a slot.
+        needed = self.CONCURRENT_CALLS
+        if getattr(self._local, 'calls', 0) and self._local.slot:
+            needed -= 1
+        for acquired in xrange(needed):
+            if not self._calls.acquire(blocking):
+                for i in xrange(acquired):
+                    self._calls.release()
+                self.lock.release()
+                return False
+        self._local.exclusive = 1
+        self._local.exclusive_slots = needed
+        return True
+
+    def release_exclusive(self):
+        """
+        Release the exclusive access acquired by :func:`acquire_exclusive`.
+        """
+        if self.CONCURRENT_CALLS <= 1:
+            self.lock.release()
+            return
+
+        self._local.exclusive -= 1
+        if self._local.exclusive == 0:
+            for i in xrange(self._local.exclusive_slots):
+                self._calls.release()
+            self.lock.release()
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Context manager to have an exclusive access to the backend, for
+        example to deinitialize it, even if it allows concurrent calls.
+        """
+        self.acquire_exclusive()
+        try:
+            yield
+        finally:
+            self.release_exclusive()
 
     def __repr__(self):
         return u"<Backend %r>" % self.name
@@ -269,15 +377,27 @@ class BaseBackend(object):
         self.name = name
         self.lock = RLock()
 
+        # Load configuration of backend, unless it is already done.
+        if isinstance(config, BackendConfig):
+            self.config = config
+            config = config.params
+        else:
+            self.config = self.CONFIG.load(weboob, self.NAME, self.name, config)
+
         # Private fields (which start with '_')
         self._private_config = dict((key, value) for key, value in config.iteritems() if key.startswith('_'))
 
-        # Load configuration of backend.
-        self.config = self.CONFIG.load(weboob, self.NAME, self.name, config)
-
         self.storage = BackendStorage(self.name, storage)
         self.storage.load(self.STORAGE)
 
+        # Used when CONCURRENT_CALLS is greater than 1, where self.lock is
+        # only taken to have an exclusive access.
+        self._calls = BoundedSemaphore(self.CONCURRENT_CALLS)
+        self._pool_lock = RLock()
+        self._idle_browsers = []
+        self._default_pooled = False
+        self._local = local()
+
     def deinit(self):
         """
         This abstract method is called when the backend is unloaded.
@@ -293,11 +413,47 @@ class BaseBackend(object):
         of this attribute, to avoid useless pages access.
 
         Note that the :func:`create_default_browser` method is called to create it.
+
+        If ``CONCURRENT_CALLS`` is greater than 1, a call (in a ``with
+        backend:`` block) gets a browser of the pool, which is not used by
+        other calls until the end of this one. Jobs started by a call, as
+        the ones of :func:`fillobj_many`, use the browser of this call. The
+        first browser of the pool is the default one, so outside of a call,
+        the default browser may be used by a call at the same time.
         """
+        caller_browser = getattr(self._local, 'caller_browser', None)
+        if caller_browser is not None:
+            return caller_browser
+
+        if getattr(self._local, 'calls', 0):
+            if self._local.browser is None:
+                self._local.browser = self._get_pool_browser()
+            return self._local.browser
+
         if self._browser is None:
             self._browser = self.create_default_browser()
         return self._browser
 
+    def _get_pool_browser(self):
+        with self._pool_lock:
+            if self._idle_browsers:
+                return self._idle_browsers.pop()
+            if not self._default_pooled:
+                self._default_pooled = True
+                if self._browser is None:
+                    self._browser = self.create_default_browser()
+                return self._browser
+            default = self._browser
+
+        state = None
+        if self.SHARE_BROWSER_STATE:
+            state = default.dump_state()
+        self._local.browser_state = state
+        try:
+            return self.create_default_browser()
+        finally:
+            self._local.browser_state = None
+
     def create_default_browser(self):
         """
         Method to overload to build the default browser in
@@ -325,8 +481,28 @@ class BaseBackend(object):
             kwargs.setdefault('responses_dirname', os.path.join(self.BROWSER.responses_dirname,
                                                                 self._private_config.get('_debug_dir', self.name)))
 
+        # State of the default browser given to a browser of the pool.
+        state = getattr(self._local, 'browser_state', None)
+        if state is None and self.SAVE_BROWSER_STATE:
+            state = self.storage.get('browser_state', default=None)
+        if state is not None:
+            kwargs.setdefault('state', state)
+
         return self.BROWSER(*args, **kwargs)
 
+    def save_browser_state(self):
+        """
+        Save the state of the browser in storage, if the ``SAVE_BROWSER_STATE``
+        class attribute is True and the browser has been used.
+
+        It is called when the backend is unloaded.
+        """
+        if not self.SAVE_BROWSER_STATE or self._browser is None:
+            return
+
+        self.storage.set('browser_state', self._browser.dump_state())
+        self.storage.save()
+
     @classmethod
     def iter_caps(klass):
         """
@@ -407,3 +583,82 @@ class BaseBackend(object):
             setattr(obj, field, NotAvailable)
 
         return obj
+
+    def fillobj_many(self, objs, fields=None):
+        """
+        Fill several objects with the wanted fields.
+
+        Objects with the same class and ID are only filled once. Then, they
+        are filled by :func:`fillobj`, with at most
+        :attr:`FILLOBJ_CONCURRENCY` objects filled at the same time by the
+        weboob pool of threads.
+
+        Backends can override this method to fill objects at once (for
+        example with one request for several IDs).
+
+        :param objs: objects to fill
+        :type objs: :class:`list`
+        :param fields: what fields to fill; if None, all fields are filled
+        :type fields: :class:`list`
+        :returns: filled objects, in the same order
+        :rtype: :class:`list`
+        """
+        if isinstance(fields, basestring):
+            fields = (fields,)
+
+        results = list(objs)
+        # For each object to fill, indexes of its duplicates
+        unique = OrderedDict()
+        keys = {}
+        for i, obj in enumerate(objs):
+            if isinstance(obj, CapBaseObject) and obj.id:
+                key = (obj.__class__, obj.id)
+                if key in keys:
+                    unique[keys[key]].append(i)
+                    continue
+                keys[key] = i
+            unique[i] = []
+
+        def fill(indexes):
+            for i in indexes:
+                results[i] = self.fillobj(objs[i], fields)
+
+        todo = unique.keys()
+        concurrency = min(self.FILLOBJ_CONCURRENCY, len(todo))
+        if concurrency > 1:
+            # Jobs are part of the current call, so they use its browser
+            # instead of the default one, which may be lent to another call.
+            browser = None
+            if self.CONCURRENT_CALLS > 1 and getattr(self._local, 'calls', 0):
+                browser = self.browser
+
+            def fill_job(indexes):
+                self._local.caller_browser = browser
+                try:
+                    fill(indexes)
+                finally:
+                    self._local.caller_browser = None
+
+            workers = self.weboob.workers
+            jobs = [workers.submit(self.NAME, fill_job, todo[n::concurrency]) for n in xrange(concurrency)]
+            with workers.blocking():
+                for job in jobs:
+                    job.wait()
+            for job in jobs:
+                job.raise_error()
+        else:
+            fill(todo)
+
+        for i, duplicates in unique.iteritems():
+            filled = results[i]
+            if filled is None or not duplicates:
+                continue
+
+            if fields is None:
+                names = [name for name, value in filled.iter_fields() if name != 'id']
+            else:
+                names = fields
+            for j in duplicates:
+                for name in names:
+                    setattr(results[j], name, getattr(filled, name))
+        return results
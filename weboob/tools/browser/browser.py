@@ -27,6 +27,8 @@ try:
     import mechanize
 except ImportError:
     raise ImportError('Please install python-mechanize')
+from mechanize._response import closeable_response
+from mechanize._urllib2_fork import create_readline_wrapper
 
 import os
 import sys
@@ -43,14 +45,17 @@ import urllib2
 from urlparse import urlsplit
 import mimetypes
 from contextlib import closing
+from functools import partial
 from gzip import GzipFile
 import warnings
 
-from weboob.tools.decorators import retry
+from weboob.tools.cookies import dump_cookies, load_cookies
 from weboob.tools.log import getLogger
 from weboob.tools.mech import ClientForm
 ControlNotFoundError = ClientForm.ControlNotFoundError
 from weboob.tools.parsers import get_parser
+from weboob.tools.ratelimit import RateLimiter
+from weboob.tools.retry import RetryPolicy
 
 # Try to load cookies
 try:
@@ -153,6 +158,294 @@ class BasePage(object):
         pass
 
 
+class KeepAliveHTTPResponse(httplib.HTTPResponse):
+    """
+    Response of a pooled connection, which gives back the connection to
+    its pool once the body is entirely read.
+    """
+    release = None
+    reading = False
+
+    def read(self, amt=None):
+        self.reading = True
+        try:
+            s = httplib.HTTPResponse.read(self, amt)
+        except Exception:
+            self.reading = False
+            self._release(False)
+            raise
+        self.reading = False
+        # httplib closes the response when the end of the body is reached.
+        if self.fp is None:
+            self._release(True)
+        return s
+
+    def close(self):
+        httplib.HTTPResponse.close(self)
+        if not self.reading:
+            # Closed before the end of the body, the remaining data is
+            # still on the socket.
+            self._release(self.length == 0)
+
+    def _release(self, reusable):
+        release, self.release = self.release, None
+        if release is not None:
+            release(reusable)
+
+
+class KeepAliveMixin(object):
+    """
+    Mixin for mechanize HTTP handlers to keep connections alive, instead of
+    opening a new connection (and doing a new TLS handshake) for each
+    request.
+
+    Idle connections are kept in a pool per host, and a connection closed by
+    the server while it was idle is replaced by a new one. If the connection
+    fails once the request is sent, the server may have processed it, so it
+    is only sent again for idempotent methods.
+    """
+    MAX_CONNECTIONS_PER_HOST = 4
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD'])
+
+    def __init__(self):
+        self.pool = {}
+        self.pool_lock = RLock()
+
+    def do_open(self, http_class, req):
+        host_port = req.get_host()
+        if not host_port:
+            raise urllib2.URLError('no host given')
+
+        key = self._get_key(req)
+        headers = dict(req.headers)
+        headers.update(req.unredirected_hdrs)
+        headers['Connection'] = 'keep-alive'
+        headers = dict((name.title(), val) for name, val in headers.iteritems())
+
+        h = self._get_connection(key)
+        if h is not None:
+            if isinstance(req.timeout, (int, float)) and h.sock is not None:
+                h.sock.settimeout(req.timeout)
+            try:
+                self._send(h, req, headers)
+            except (socket.error, httplib.CannotSendRequest):
+                # The server has closed the connection while it was idle.
+                h.close()
+                h = None
+            else:
+                try:
+                    r = h.getresponse()
+                except (socket.error, httplib.BadStatusLine) as err:
+                    h.close()
+                    h = None
+                    if req.get_method() not in self.IDEMPOTENT_METHODS:
+                        if isinstance(err, socket.error):
+                            raise urllib2.URLError(err)
+                        raise
+
+        if h is None:
+            h = self._new_connection(http_class, req)
+            try:
+                self._send(h, req, headers)
+                r = h.getresponse()
+            except socket.error as err:
+                h.close()
+                raise urllib2.URLError(err)
+            except Exception:
+                h.close()
+                raise
+
+        r.release = lambda reusable: self._put_connection(key, h, reusable)
+
+        r.recv = r.read
+        fp = create_readline_wrapper(r)
+        return closeable_response(fp, r.msg, req.get_full_url(), r.status, r.reason)
+
+    def _get_key(self, req):
+        return (req.get_type(), req.get_host(), req._tunnel_host)
+
+    def _new_connection(self, http_class, req):
+        try:
+            h = http_class(req.get_host(), timeout=req.timeout)
+        except TypeError:
+            h = http_class(req.get_host())
+        h.response_class = KeepAliveHTTPResponse
+        if req._tunnel_host:
+            h.set_tunnel(req._tunnel_host)
+        return h
+
+    def _send(self, h, req, headers):
+        h.set_debuglevel(self._debuglevel)
+        h.request(req.get_method(), req.get_selector(), req.data, headers)
+
+    def _get_connection(self, key):
+        with self.pool_lock:
+            idle = self.pool.get(key)
+            if idle:
+                return idle.pop()
+
+    def _put_connection(self, key, h, reusable):
+        if reusable and h.sock is not None:
+            with self.pool_lock:
+                idle = self.pool.setdefault(key, [])
+                if len(idle) < self.MAX_CONNECTIONS_PER_HOST:
+                    idle.append(h)
+                    return
+        h.close()
+
+    def close(self):
+        """
+        Close idle connections.
+        """
+        with self.pool_lock:
+            for idle in self.pool.itervalues():
+                for h in idle:
+                    h.close()
+            self.pool.clear()
+
+
+class KeepAliveHTTPHandler(KeepAliveMixin, mechanize.HTTPHandler):
+    def __init__(self, *args, **kwargs):
+        mechanize.HTTPHandler.__init__(self, *args, **kwargs)
+        KeepAliveMixin.__init__(self)
+
+
+class KeepAliveHTTPSHandler(KeepAliveMixin, mechanize.HTTPSHandler):
+    def __init__(self, *args, **kwargs):
+        mechanize.HTTPSHandler.__init__(self, *args, **kwargs)
+        KeepAliveMixin.__init__(self)
+
+    def _get_key(self, req):
+        key = KeepAliveMixin._get_key(self, req)
+        if self.client_cert_manager is not None:
+            # Connections depend on the client certificate.
+            key += self.client_cert_manager.find_key_cert(req.get_full_url())
+        return key
+
+
+class RateLimitProcessor(mechanize.BaseHandler):
+    """
+    Wait before each request, redirections included, to respect the rate
+    limit of the host.
+
+    :type limiter: :class:`weboob.tools.ratelimit.RateLimiter`
+    """
+    # After the other processors, just before sending the request.
+    handler_order = 900
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    def http_request(self, request):
+        self.limiter.wait(request.get_full_url())
+        return request
+
+    https_request = http_request
+
+
+class _PagesIndex(object):
+    """
+    Private dispatch table of the PAGES of a BaseBrowser.
+
+    Regexps are compiled once, and consecutive regexps which match from the
+    beginning of the url are combined in one alternation, so the re module
+    tries them at once.
+    """
+    # The re module does not support more than 100 groups in a regexp.
+    MAX_GROUPS = 99
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.entries = []
+        for key, value in pages.iteritems():
+            if isinstance(key, basestring):
+                if not key.startswith('^') and not key.endswith('$'):
+                    regexp = re.compile('^%s$' % key)
+                else:
+                    regexp = re.compile(key)
+            else:
+                regexp = key
+            self.entries.append((regexp, value))
+
+        # List of (regexp, index), where index is the position of the entry
+        # in self.entries, or None if regexp is a combined one.
+        self.chunks = []
+        branches = []
+        groups = 0
+        for index, (regexp, value) in enumerate(self.entries):
+            branch = self._get_branch(regexp)
+            if branch is None or groups + regexp.groups + 1 > self.MAX_GROUPS:
+                self._add_branches(branches)
+                branches = []
+                groups = 0
+            if branch is None:
+                self.chunks.append((regexp, index))
+            else:
+                branches.append((index, branch))
+                groups += regexp.groups + 1
+        self._add_branches(branches)
+
+    def _get_branch(self, regexp):
+        """
+        Get the pattern to use in a combined regexp, or None if it can't be
+        combined.
+        """
+        pattern = regexp.pattern
+        # A regexp which is not anchored may match after the beginning of
+        # the url, and flags would be applied to other regexps.
+        if not pattern.startswith('^') or regexp.flags:
+            return None
+        # Only the first alternative would be anchored. (browser2 imports
+        # parsers, which import this module.)
+        from weboob.tools.browser2.page import _has_alternative
+        if _has_alternative(pattern):
+            return None
+        # Groups are renumbered, and names can be used by several regexps.
+        if re.search(r'\\[0-9]|\(\?P=', pattern):
+            return None
+        return re.sub(r'(?<!\\)\(\?P<\w+>', '(?:', pattern)
+
+    def _add_branches(self, branches):
+        if not branches:
+            return
+
+        regexp = None
+        if len(branches) > 1:
+            try:
+                regexp = re.compile('|'.join('(?P<_%d>%s)' % branch for branch in branches))
+            except re.error:
+                # Keep them separated if it isn't supported.
+                pass
+
+        if regexp is None:
+            for index, branch in branches:
+                self.chunks.append((self.entries[index][0], index))
+        else:
+            self.chunks.append((regexp, None))
+
+    def match(self, url):
+        """
+        Find the first entry of PAGES, in order of iteration, which matches
+        an url.
+
+        :returns: the value of the entry and the match object, or None if
+                  there is no match
+        :rtype: tuple
+        """
+        for regexp, index in self.chunks:
+            if index is None:
+                m = regexp.match(url)
+                if m is None:
+                    continue
+                # The outermost group is the one of the matching regexp.
+                index = int(m.lastgroup[1:])
+                regexp = self.entries[index][0]
+
+            m = regexp.search(url)
+            if m:
+                return self.entries[index][1], m
+
+
 def check_location(func):
     def inner(self, *args, **kwargs):
         if args and isinstance(args[0], basestring):
@@ -168,6 +461,18 @@ def check_location(func):
     return inner
 
 
+def get_request_method(args, kwargs):
+    """
+    Get the HTTP method of a request made with the arguments of
+    :func:`mechanize.Browser.open`.
+    """
+    if args and isinstance(args[0], mechanize.Request):
+        return args[0].get_method()
+    if len(args) > 1 and args[1] is not None or kwargs.get('data') is not None:
+        return 'POST'
+    return 'GET'
+
+
 class StandardBrowser(mechanize.Browser):
     """
     Standard Browser.
@@ -183,6 +488,8 @@ class StandardBrowser(mechanize.Browser):
     :type proxy: str
     :param factory: mechanize factory. None to use Mechanize's default
     :type factory: object
+    :param state: state returned by :func:`dump_state` to restore
+    :type state: dict
     """
 
     # ------ Class attributes --------------------------------------
@@ -200,6 +507,11 @@ class StandardBrowser(mechanize.Browser):
     DEBUG_MECHANIZE = False
     DEFAULT_TIMEOUT = 15
     INSECURE = False  # if True, do not validate SSL
+    # Maximum rate of requests on each host, as a tuple (requests per second,
+    # burst), shared by every browser and process. None to disable.
+    RATE_LIMIT = None
+    # Policy to retry requests which failed because of a transient error.
+    RETRY_POLICY = RetryPolicy(exceptions=(urllib2.URLError, BadStatusLine, ssl.SSLError, socket.error))
 
     responses_dirname = None
     responses_count = 0
@@ -213,7 +525,12 @@ class StandardBrowser(mechanize.Browser):
     default_features.remove('_robots')
     default_features.remove('_refresh')
 
-    def __init__(self, firefox_cookies=None, parser=None, history=NoHistory(), proxy=None, logger=None, factory=None, responses_dirname=None):
+    # Keep connections alive between requests.
+    handler_classes = copy(mechanize.Browser.handler_classes)
+    handler_classes['http'] = KeepAliveHTTPHandler
+    handler_classes['https'] = KeepAliveHTTPSHandler
+
+    def __init__(self, firefox_cookies=None, parser=None, history=NoHistory(), proxy=None, logger=None, factory=None, responses_dirname=None, state=None):
         mechanize.Browser.__init__(self, history=history, factory=factory)
         self.logger = getLogger('browser', logger)
 
@@ -258,6 +575,38 @@ class StandardBrowser(mechanize.Browser):
 
         self.responses_dirname = responses_dirname
 
+        if self.RATE_LIMIT is not None:
+            self.add_handler(RateLimitProcessor(RateLimiter(*self.RATE_LIMIT)))
+
+        if state is not None:
+            self.load_state(state)
+
+    def dump_state(self):
+        """
+        Get the state of the browser, to restore it later with
+        :func:`load_state`, for example to keep the session on website
+        between two runs.
+
+        It contains cookies, so it is as sensitive as a password.
+
+        :rtype: dict
+        """
+        return {'cookies': dump_cookies(self._ua_handlers['_cookies'].cookiejar)}
+
+    def load_state(self, state):
+        """
+        Restore a state returned by :func:`dump_state`.
+
+        :type state: dict
+        """
+        load_cookies(self._ua_handlers['_cookies'].cookiejar, state.get('cookies', []), mechanize.Cookie)
+
+    def close(self):
+        for handler in self.handlers:
+            if isinstance(handler, KeepAliveMixin):
+                handler.close()
+        mechanize.Browser.close(self)
+
     def __enter__(self):
         self.lock.acquire()
 
@@ -267,8 +616,10 @@ class StandardBrowser(mechanize.Browser):
     def _openurl(self, *args, **kwargs):
         return mechanize.Browser.open(self, *args, **kwargs)
 
+    def _retry(self, func, args, kwargs):
+        return self.RETRY_POLICY.run(lambda: func(*args, **kwargs), get_request_method(args, kwargs), self.logger)
+
     @check_location
-    @retry(BrowserHTTPError, tries=3)
     def openurl(self, *args, **kwargs):
         """
         Open an URL but do not create a Page object.
@@ -279,7 +630,7 @@ class StandardBrowser(mechanize.Browser):
         kwargs['timeout'] = kwargs.get('timeout', self.DEFAULT_TIMEOUT)
 
         try:
-            return self._openurl(*args, **kwargs)
+            return self._retry(self._openurl, args, kwargs)
         except (mechanize.BrowserStateError, mechanize.response_seek_wrapper,
                 urllib2.HTTPError, urllib2.URLError, BadStatusLine, ssl.SSLError) as e:
             if isinstance(e, mechanize.BrowserStateError) and hasattr(self, 'home'):
@@ -490,6 +841,10 @@ class BaseBrowser(StandardBrowser):
     :type get_homme: bool
     :param responses_dirname: directory to store responses
     :type responses_dirname: str
+    :param state: state returned by :func:`StandardBrowser.dump_state` to
+                  restore; is_logged() is checked on the first loaded page
+                  as usual, so the session is reused if it is still valid
+    :type state: dict
     """
 
     # ------ Class attributes --------------------------------------
@@ -533,8 +888,8 @@ class BaseBrowser(StandardBrowser):
 
     def __init__(self, username=None, password=None, firefox_cookies=None,
                  parser=None, history=NoHistory(), proxy=None, logger=None,
-                 factory=None, get_home=True, responses_dirname=None):
-        StandardBrowser.__init__(self, firefox_cookies, parser, history, proxy, logger, factory, responses_dirname)
+                 factory=None, get_home=True, responses_dirname=None, state=None):
+        StandardBrowser.__init__(self, firefox_cookies, parser, history, proxy, logger, factory, responses_dirname, state)
         self.page = None
         self.last_update = 0.0
         self.username = username
@@ -600,7 +955,6 @@ class BaseBrowser(StandardBrowser):
         return mechanize.Browser.open_novisit(self, *args, **kwargs)
 
     @check_location
-    @retry(BrowserHTTPError, tries=3)
     def location(self, *args, **kwargs):
         """
         Change location of browser on an URL.
@@ -619,7 +973,8 @@ class BaseBrowser(StandardBrowser):
         kwargs['timeout'] = kwargs.get('timeout', self.DEFAULT_TIMEOUT)
 
         try:
-            self._change_location(mechanize.Browser.open(self, *args, **kwargs), no_login=no_login)
+            response = self._retry(partial(mechanize.Browser.open, self), args, kwargs)
+            self._change_location(response, no_login=no_login)
         except BrowserRetry:
             if not self.page or not args or self.page.url != args[0]:
                 keep_kwargs['no_login'] = True
@@ -664,6 +1019,22 @@ class BaseBrowser(StandardBrowser):
                 response.set_data(data)
         mechanize.Browser._set_response(self, response, *args, **kwargs)
 
+    def get_pages_index(self):
+        """
+        Get the dispatch table of PAGES.
+
+        It is built once for each PAGES dict, so PAGES must not be modified
+        in place, but replaced by a new dict.
+        """
+        index = getattr(self, '_pages_index', None)
+        if index is None or index.pages is not self.PAGES:
+            index = _PagesIndex(self.PAGES)
+            if 'PAGES' in self.__dict__:
+                self._pages_index = index
+            else:
+                self.__class__._pages_index = index
+        return index
+
     def _change_location(self, result, no_login=False):
         """
         This function is called when we have moved to a page, to load a Page
@@ -675,26 +1046,18 @@ class BaseBrowser(StandardBrowser):
         parser = None
         page_groups = None
         page_group_dict = None
-        for key, value in self.PAGES.items():
-            if isinstance(key, basestring):
-                if not key.startswith('^') and not key.endswith('$'):
-                    regexp = re.compile('^%s$' % key)
-                else:
-                    regexp = re.compile(key)
+        found = self.get_pages_index().match(result.geturl())
+        if found:
+            value, m = found
+            if isinstance(value, (list, tuple)):
+                pageCls = value[0]
+                parser = value[1]
             else:
-                regexp = key
-            m = regexp.search(result.geturl())
-            if m:
-                if isinstance(value, (list, tuple)):
-                    pageCls = value[0]
-                    parser = value[1]
-                else:
-                    pageCls = value
-                    parser = self.parser
+                pageCls = value
+                parser = self.parser
 
-                page_groups = m.groups()
-                page_group_dict = m.groupdict()
-                break
+            page_groups = m.groups()
+            page_group_dict = m.groupdict()
 
         # Not found
         if not pageCls:
@@ -20,9 +20,16 @@
 from __future__ import absolute_import
 
 from urlparse import urlparse, urljoin
+from threading import Lock
+import cookielib
+
 import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
 
+from weboob.tools.cookies import dump_cookies, load_cookies
 from weboob.tools.log import getLogger
+from weboob.tools.ratelimit import RateLimiter
+from weboob.tools.retry import RetryPolicy
 
 
 # TODO define __all__
@@ -105,6 +112,79 @@ class Wget(Profile):
         #session.config['keep_alive'] = True
 
 
+class TransportPool(object):
+    """
+    Pool of python-requests transport adapters, to share connections
+    between browsers.
+
+    There is one adapter for each TLS setting (certificate verification and
+    client certificate), and each adapter keeps connections to every host.
+    Cookies are not shared, as they are stored in the session of each
+    browser.
+
+    :param pool_connections: number of hosts to keep connections to
+    :type pool_connections: :class:`int`
+    :param pool_maxsize: maximum number of connections kept to each host
+    :type pool_maxsize: :class:`int`
+    """
+
+    def __init__(self, pool_connections=20, pool_maxsize=10):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.adapters = {}
+        self.lock = Lock()
+
+    def get_adapter(self, verify=True, cert=None):
+        """
+        Get the adapter to use for the given TLS settings.
+
+        :rtype: :class:`requests.adapters.HTTPAdapter`
+        """
+        if isinstance(cert, list):
+            cert = tuple(cert)
+        key = (verify, cert)
+        with self.lock:
+            try:
+                return self.adapters[key]
+            except KeyError:
+                adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                                      pool_maxsize=self.pool_maxsize)
+                self.adapters[key] = adapter
+                return adapter
+
+    def close(self):
+        """
+        Close every connection.
+        """
+        with self.lock:
+            for adapter in self.adapters.itervalues():
+                adapter.close()
+            self.adapters.clear()
+
+
+class SharedAdapter(BaseAdapter):
+    """
+    Adapter mounted on the session of a browser, which sends requests
+    through the adapters of a :class:`TransportPool`.
+    """
+
+    def __init__(self, pool):
+        super(SharedAdapter, self).__init__()
+        self.pool = pool
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        adapter = self.pool.get_adapter(verify, cert)
+        return adapter.send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+    def close(self):
+        # Connections are used by other browsers.
+        pass
+
+
+# Pool shared by every browser which sets BaseBrowser.TRANSPORTS to it.
+SHARED_TRANSPORTS = TransportPool()
+
+
 class BaseBrowser(object):
     """
     Simple browser class.
@@ -113,13 +193,47 @@ class BaseBrowser(object):
 
     PROFILE = Firefox()
     TIMEOUT = 10.0
-
-    def __init__(self, logger=None):
+    # TransportPool used to share connections with other browsers, for
+    # example SHARED_TRANSPORTS. If None, the browser has its own connections.
+    TRANSPORTS = None
+    # Maximum rate of requests on each host, as a tuple (requests per second,
+    # burst), shared by every browser and process. None to disable.
+    RATE_LIMIT = None
+    # Policy to retry requests which failed because of a transient error.
+    RETRY_POLICY = RetryPolicy(exceptions=(requests.ConnectionError, requests.Timeout))
+
+    def __init__(self, logger=None, state=None):
         self.logger = getLogger('browser', logger)
         self._setup_session(self.PROFILE)
+        self.rate_limiter = None
+        if self.RATE_LIMIT is not None:
+            self.rate_limiter = RateLimiter(*self.RATE_LIMIT)
         self.url = None
         self.response = None
 
+        if state is not None:
+            self.load_state(state)
+
+    def dump_state(self):
+        """
+        Get the state of the browser, to restore it later with
+        :func:`load_state`, for example to keep the session on website
+        between two runs.
+
+        It contains cookies, so it is as sensitive as a password.
+
+        :rtype: dict
+        """
+        return {'cookies': dump_cookies(self.session.cookies)}
+
+    def load_state(self, state):
+        """
+        Restore a state returned by :func:`dump_state`.
+
+        :type state: dict
+        """
+        load_cookies(self.session.cookies, state.get('cookies', []), cookielib.Cookie)
+
     def _setup_session(self, profile):
         """
         Set up a python-requests session for our usage.
@@ -136,6 +250,11 @@ class BaseBrowser(object):
         # TODO max_retries?
         # TODO connect config['verbose'] to our logger
 
+        if self.TRANSPORTS is not None:
+            adapter = SharedAdapter(self.TRANSPORTS)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+
         profile.setup_session(session)
 
         self.session = session
@@ -191,7 +310,8 @@ class BaseBrowser(object):
 
         # guess method
         if req.method is None:
-            if req.data is None:
+            # python-requests replaces a None data by an empty list.
+            if req.data or kwargs.get('data') is not None:
                 req.method = 'POST'
             else:
                 req.method = 'GET'
@@ -212,10 +332,15 @@ class BaseBrowser(object):
         preq = self.session.prepare_request(req)
 
         # call python-requests
-        response = self.session.send(preq)
+        response = self.RETRY_POLICY.run(lambda: self._send(preq), preq.method, self.logger)
 
         return response
 
+    def _send(self, preq):
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait(preq.url)
+        return self.session.send(preq)
+
     def get_referrer(self, oldurl, newurl):
         """
         Get the referrer to send when doing a request.
@@ -54,6 +54,8 @@ class URL(object):
 
         self._creation_counter = URL._creation_counter
         URL._creation_counter += 1
+        # Output of normalize(), computed on first navigation
+        self._patterns = None
 
     def is_here(self):
         """
@@ -84,11 +86,13 @@ class URL(object):
         >>> url = URL('http://exawple.org/(?P<pagename>).html')
         >>> url.stay_or_go(pagename='index')
         """
-        patterns = []
-        for url in self.urls:
-            patterns += normalize(url)
+        if self._patterns is None:
+            patterns = []
+            for url in self.urls:
+                patterns += normalize(url)
+            self._patterns = patterns
 
-        for pattern, args in patterns:
+        for pattern, args in self._patterns:
             url = pattern % kwargs
             return self.browser.location(url)
 
@@ -104,9 +108,130 @@ class URL(object):
                 return self.klass(self.browser, response, m.groupdict())
 
 
+def _has_alternative(regex):
+    """
+    Return True if regex has a top-level '|'.
+    """
+    depth = 0
+    i = 0
+    while i < len(regex):
+        c = regex[i]
+        if c == '\\':
+            i += 1
+        elif c == '[':
+            # Skip the characters class, where a leading ']' is literal.
+            i += 1
+            if regex[i:i+1] == '^':
+                i += 1
+            if regex[i:i+1] == ']':
+                i += 1
+            while i < len(regex) and regex[i] != ']':
+                if regex[i] == '\\':
+                    i += 1
+                i += 1
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == '|' and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def _literal_prefix(regex):
+    """
+    Return the string which starts every string matched by regex.
+
+    >>> _literal_prefix(r'/fr/list-(?P<page>\d+)\.html')
+    '/fr/list-'
+    >>> _literal_prefix(r'/(index\.html)?')
+    '/'
+    >>> _literal_prefix(r'/forms?/')
+    '/form'
+    >>> _literal_prefix(r'/login|/logout')
+    ''
+    """
+    if _has_alternative(regex):
+        return ''
+
+    prefix = []
+    i = 0
+    while i < len(regex):
+        c = regex[i]
+        if c == '\\':
+            if regex[i+1:i+2].isalnum() or not regex[i+1:i+2]:
+                # Characters class or backreference.
+                break
+            c = regex[i+1]
+            step = 2
+        elif c in '.^$*+?{}[]|()':
+            break
+        else:
+            step = 1
+        if regex[i+step:i+step+1] in ('*', '?', '{'):
+            # This character is optional.
+            break
+        prefix.append(c)
+        i += step
+    return ''.join(prefix)
+
+
+class _URLRouter(object):
+    """
+    Private dispatch table of the URL instances of a PagesBrowser class.
+
+    Regexps are compiled once, and they are indexed in a trie by their
+    literal prefix, so only regexps which may match an url are tried.
+    Regexps starting with '/' are relative to the BASEURL of browser.
+    """
+    def __init__(self, urls):
+        self.absolute = {}
+        self.relative = {}
+        for order, (name, url) in enumerate(urls.iteritems()):
+            if url.klass is None:
+                continue
+            for index, regex in enumerate(url.urls):
+                trie = self.relative if regex.startswith('/') else self.absolute
+                node = trie
+                for c in _literal_prefix(regex):
+                    node = node.setdefault(c, {})
+                node.setdefault(None, []).append(((order, index), name, re.compile(regex)))
+
+    def _lookup(self, trie, string):
+        node = trie
+        entries = list(node.get(None, ()))
+        for c in string:
+            node = node.get(c)
+            if node is None:
+                break
+            entries.extend(node.get(None, ()))
+        return [(key, name, regex, string) for key, name, regex in entries]
+
+    def match(self, url, baseurl):
+        """
+        Find the first URL instance, in order of definition, which matches
+        an url.
+
+        :returns: the name of the URL instance and the named groups of the
+                  regexp, or None if there is no match
+        :rtype: tuple
+        """
+        entries = self._lookup(self.absolute, url)
+        if baseurl and url.startswith(baseurl):
+            entries += self._lookup(self.relative, url[len(baseurl):])
+        entries.sort(key=lambda entry: entry[0])
+
+        for key, name, regex, string in entries:
+            m = regex.match(string)
+            if m:
+                return name, m.groupdict()
+
+
 class _PagesBrowserMeta(type):
     """
-    Private meta-class used to keep order of URLs instances of PagesBrowser.
+    Private meta-class used to keep order of URLs instances of PagesBrowser,
+    and to build their dispatch table.
     """
     def __new__(cls, name, bases, attrs):
         urls = [(url_name, attrs.pop(url_name)) for url_name, obj in attrs.items() if isinstance(obj, URL)]
@@ -114,10 +239,11 @@ class _PagesBrowserMeta(type):
 
         new_class = super(_PagesBrowserMeta, cls).__new__(cls, name, bases, attrs)
         if new_class._urls is None:
-            new_class._urls = {}
+            new_class._urls = OrderedDict()
         else:
             new_class._urls = deepcopy(new_class._urls)
         new_class._urls.update(urls)
+        new_class._router = _URLRouter(new_class._urls)
         return new_class
 
 class PagesBrowser(DomainBrowser):
@@ -142,6 +268,7 @@ class PagesBrowser(DomainBrowser):
 
 
     _urls = None
+    _router = None
     __metaclass__ = _PagesBrowserMeta
 
     def __getattr__(self, name):
@@ -163,11 +290,12 @@ class PagesBrowser(DomainBrowser):
         response = super(PagesBrowser, self).open(*args, **kwargs)
 
         # Try to handle the response page with an URL instance.
-        for url in self._urls.itervalues():
-            page = url.handle(response)
-            if page is not None:
-                self.logger.debug('Handle %s with %s' % (response.url, page.__class__.__name__))
-                return page
+        match = self._router.match(response.url, self.BASEURL)
+        if match is not None:
+            name, params = match
+            page = self._urls[name].klass(self, response, params)
+            self.logger.debug('Handle %s with %s' % (response.url, page.__class__.__name__))
+            return page
 
         self.logger.debug('Unable to handle %s' % response.url)
         return response
@@ -246,7 +374,7 @@ def need_login(func):
     Decorator used to require to be logged to access to this function.
     """
     def inner(browser, *args, **kwargs):
-        if browser.page is None or not browser.page.logged:
+        if not browser.is_logged():
             browser.do_login()
         return func(browser, *args, **kwargs)
 
@@ -257,11 +385,37 @@ class LoginBrowser(PagesBrowser):
     """
     A browser which supports login.
     """
+    # URL of a page only available when logged, which can be loaded at any
+    # time without side effect. After load_state(), it is loaded to check
+    # if the restored session is still valid; if None, the browser logs in
+    # again.
+    LOGGED_URL = None
+
     def __init__(self, username, password, *args, **kwargs):
+        # Set by load_state(), which may be called by the constructor.
+        self.session_restored = False
         super(LoginBrowser, self).__init__(*args, **kwargs)
         self.username = username
         self.password = password
 
+    def load_state(self, state):
+        super(LoginBrowser, self).load_state(state)
+        self.session_restored = True
+
+    def is_logged(self):
+        """
+        Return True if the current page is only available when logged.
+
+        If the state has been restored by :func:`load_state`, the
+        :attr:`LOGGED_URL` page is loaded once to check if the session is
+        still valid.
+        """
+        if self.page is None and self.session_restored:
+            self.session_restored = False
+            if self.LOGGED_URL is not None:
+                self.location(self.LOGGED_URL)
+        return self.page is not None and self.page.logged
+
     def do_login(self):
         """"
         Abstract method to implement to login on website.
@@ -333,13 +487,29 @@ class Form(OrderedDict):
 class HTMLPage(BasePage):
     """
     HTML page.
+
+    The document is parsed the first time the :attr:`doc` attribute is
+    read, so a page which is never inspected costs no parsing time.
     """
     FORM_CLASS = Form
 
     def __init__(self, browser, response, *args, **kwargs):
         super(HTMLPage, self).__init__(browser, response, *args, **kwargs)
-        parser = LxmlHtmlParser()
-        self.doc = parser.parse(StringIO(response.content), response.encoding)
+        self._doc = None
+
+    @property
+    def doc(self):
+        """
+        Parsed document of the page.
+        """
+        if self._doc is None:
+            parser = LxmlHtmlParser()
+            self._doc = parser.parse(StringIO(self.response.content), self.response.encoding)
+        return self._doc
+
+    @doc.setter
+    def doc(self, doc):
+        self._doc = doc
 
     def get_form(self, xpath=None, name=None, nr=None):
         """
@@ -21,6 +21,7 @@
 import os
 import tempfile
 import logging
+import cPickle
 import yaml
 
 try:
@@ -37,8 +38,18 @@ __all__ = ['YamlConfig']
 
 
 class YamlConfig(IConfig):
+    """
+    Configuration stored in a YAML file.
+
+    A snapshot of the parsed values is kept in a binary file next to the
+    YAML file, and is loaded instead of parsing the YAML file as long as
+    the modification time and size of the YAML file do not change.
+    """
+    SNAPSHOT_SUFFIX = '.snapshot'
+
     def __init__(self, path):
         self.path = path
+        self.snapshot_path = path + self.SNAPSHOT_SUFFIX
         self.values = {}
 
     def load(self, default={}):
@@ -47,7 +58,12 @@ class YamlConfig(IConfig):
         logging.debug(u'Loading application configuration file: %s.' % self.path)
         try:
             with open(self.path, 'r') as f:
-                self.values = yaml.load(f, Loader=Loader)
+                stat = os.fstat(f.fileno())
+                values = self.load_snapshot(stat)
+                if values is None:
+                    values = yaml.load(f, Loader=Loader)
+                    self.save_snapshot(values, stat)
+                self.values = values
             logging.debug(u'Application configuration file loaded: %s.' % self.path)
         except IOError:
             self.save()
@@ -56,11 +72,63 @@ class YamlConfig(IConfig):
         if self.values is None:
             self.values = {}
 
+    def load_snapshot(self, stat):
+        """
+        Get values from the snapshot, if it has been made from the YAML file
+        in its current state.
+
+        :param stat: result of os.stat() on the YAML file
+        :returns: the values, or None
+        """
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                mtime, size, values = cPickle.load(f)
+        except IOError:
+            return None
+        except Exception as e:
+            logging.debug(u'Unable to load snapshot %s: %s' % (self.snapshot_path, e))
+            return None
+
+        if (mtime, size) != (stat.st_mtime, stat.st_size):
+            return None
+        return values
+
+    def save_snapshot(self, values, stat):
+        """
+        Write values in the snapshot.
+
+        :param stat: result of os.stat() on the YAML file containing values
+        """
+        tmpname = None
+        try:
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(self.path), delete=False) as f:
+                tmpname = f.name
+                cPickle.dump((stat.st_mtime, stat.st_size, values), f, cPickle.HIGHEST_PROTOCOL)
+            os.rename(tmpname, self.snapshot_path)
+            tmpname = None
+        except Exception as e:
+            # The snapshot is only a cache, and cPickle raises various
+            # exceptions on values it does not support.
+            logging.debug(u'Unable to save snapshot %s: %s' % (self.snapshot_path, e))
+            try:
+                os.unlink(self.snapshot_path)
+            except OSError:
+                pass
+        finally:
+            if tmpname is not None:
+                try:
+                    os.unlink(tmpname)
+                except OSError:
+                    pass
+
     def save(self):
         # write in a temporary file to avoid corruption problems
         with tempfile.NamedTemporaryFile(dir=os.path.dirname(self.path), delete=False) as f:
             yaml.dump(self.values, f, Dumper=Dumper)
+            f.flush()
+            stat = os.fstat(f.fileno())
         os.rename(f.name, self.path)
+        self.save_snapshot(self.values, stat)
 
     def get(self, *args, **kwargs):
         default = None
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+__all__ = ['dump_cookies', 'load_cookies']
+
+
+COOKIE_ATTRS = ('version', 'name', 'value', 'port', 'port_specified', 'domain',
+                'domain_specified', 'domain_initial_dot', 'path', 'path_specified',
+                'secure', 'expires', 'discard', 'comment', 'comment_url', 'rfc2109')
+
+
+def dump_cookies(cookiejar):
+    """
+    Serialize cookies of a cookielib or mechanize cookie jar, to store them
+    in a :class:`weboob.tools.storage.IStorage`.
+
+    Session cookies are kept, as they usually hold the session on website.
+
+    :param cookiejar: cookie jar
+    :type cookiejar: :class:`cookielib.CookieJar`
+    :rtype: list[dict]
+    """
+    cookies = []
+    for cookie in cookiejar:
+        if cookie.is_expired():
+            continue
+        values = dict((attr, getattr(cookie, attr)) for attr in COOKIE_ATTRS)
+        values['rest'] = dict(cookie._rest)
+        cookies.append(values)
+    return cookies
+
+
+def load_cookies(cookiejar, cookies, klass):
+    """
+    Set cookies serialized by :func:`dump_cookies` in a cookie jar.
+
+    :param cookiejar: cookie jar
+    :type cookiejar: :class:`cookielib.CookieJar`
+    :param cookies: serialized cookies
+    :type cookies: list[dict]
+    :param klass: class of cookies of the jar (for example
+                  :class:`cookielib.Cookie` or :class:`mechanize.Cookie`)
+    :type klass: type
+    """
+    for values in cookies:
+        cookie = klass(**values)
+        if not cookie.is_expired():
+            cookiejar.set_cookie(cookie)
@@ -19,14 +19,12 @@
 
 
 from logging import warning
-from time import time, sleep
-from tempfile import gettempdir
-import os
 import sys
 import traceback
 import types
 # keep compatibility
 from .date import local2utc, utc2local
+from .ratelimit import get_bucket
 
 
 __all__ = ['get_backtrace', 'get_bytes_size', 'html2text', 'iter_fields',
@@ -123,31 +121,17 @@ def ratelimit(group, delay):
 
     Waits if the last call of lastlimit with this group name was less than
     delay seconds ago. The rate limiting is global, shared between any instance
-    of the application and any call to this function sharing the same group
-    name. The same group name should not be used with different delays.
+    of the application, any thread and any call to this function sharing the
+    same group name. The same group name should not be used with different
+    delays.
 
     This function is intended to be called just before the code that should be
-    rate-limited.
-
-    This function is not thread-safe. For reasonably non-critical rate
-    limiting (like accessing a website), it should be sufficient nevertheless.
+    rate-limited. See :mod:`weboob.tools.ratelimit` to allow bursts.
 
     @param group [string]  rate limiting group name, alphanumeric
     @param delay [int]  delay in seconds between each call
     """
+    if delay <= 0:
+        return
 
-    path = os.path.join(gettempdir(), 'weboob_ratelimit.%s' % group)
-    while True:
-        try:
-            offset = time() - os.stat(path).st_mtime
-        except OSError:
-            with open(path, 'w'):
-                pass
-            offset = 0
-
-        if delay < offset:
-            break
-
-        sleep(delay - offset)
-
-    os.utime(path, None)
+    get_bucket(group, 1.0 / delay).acquire()
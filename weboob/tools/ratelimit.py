@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import re
+import struct
+from tempfile import gettempdir
+from threading import Lock
+from time import time, sleep
+from urlparse import urlsplit
+
+from weboob.tools.log import getLogger
+
+try:
+    import fcntl
+except ImportError:
+    # Buckets are only shared between threads of the process.
+    fcntl = None
+
+
+__all__ = ['TokenBucket', 'get_bucket', 'RateLimiter']
+
+
+class TokenBucket(object):
+    """
+    Token bucket: a call takes a token, tokens are added at *rate* per
+    second, and at most *burst* tokens are kept, so *burst* calls can be
+    made without waiting after a quiet period.
+
+    The bucket is shared between threads, and, if *shared* is True, between
+    processes of the same user using the same *group* name, through a file
+    in the temporary directory locked during each update. Use
+    :func:`get_bucket` to share it between threads.
+
+    :param group: name of the bucket, alphanumeric
+    :type group: str
+    :param rate: number of tokens added per second
+    :type rate: float
+    :param burst: maximum number of tokens
+    :type burst: int
+    :param shared: share the bucket with other processes
+    :type shared: bool
+    """
+
+    # Tokens and time of the last update, stored in the file.
+    STATE = struct.Struct('=dd')
+
+    def __init__(self, group, rate, burst=1, shared=True):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.group = group
+        self.rate = float(rate)
+        self.burst = max(burst, 1)
+        self.lock = Lock()
+        self.logger = getLogger('tokenbucket')
+
+        self.path = None
+        self.fd = None
+        if shared and fcntl is not None:
+            # The file is private, so there is one per user.
+            self.path = os.path.join(gettempdir(), 'weboob_tokenbucket.%d.%s' % (os.getuid(), re.sub(r'[^\w\.-]', '_', group)))
+        # State when it is not shared.
+        self.tokens = self.burst
+        self.stamp = time()
+
+    def _open(self):
+        # Do not follow a symlink planted by someone else in the temporary
+        # directory.
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0)
+        try:
+            self.fd = os.open(self.path, flags, 0600)
+        except OSError as e:
+            self.logger.warning(u'Unable to open %s, the bucket is not shared: %s' % (self.path, e))
+            self.path = None
+
+    def _read(self):
+        if self.fd is None:
+            return self.tokens, self.stamp
+
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        data = os.read(self.fd, self.STATE.size)
+        if len(data) != self.STATE.size:
+            # New file.
+            return self.burst, time()
+        return self.STATE.unpack(data)
+
+    def _write(self, tokens, stamp):
+        if self.fd is None:
+            self.tokens, self.stamp = tokens, stamp
+            return
+
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        os.write(self.fd, self.STATE.pack(tokens, stamp))
+
+    def reserve(self, tokens=1):
+        """
+        Take tokens from the bucket, without waiting.
+
+        If there are not enough tokens, they are taken anyway from the
+        tokens to come, so callers are served in order.
+
+        :param tokens: number of tokens to take
+        :type tokens: int
+        :returns: number of seconds to wait before the tokens are available
+        :rtype: float
+        """
+        with self.lock:
+            if self.path is not None and self.fd is None:
+                self._open()
+
+            if self.fd is not None:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX)
+            try:
+                available, stamp = self._read()
+                now = time()
+                # The clock may go backwards.
+                available = min(self.burst, available + max(now - stamp, 0) * self.rate)
+                available -= tokens
+                self._write(available, now)
+            finally:
+                if self.fd is not None:
+                    fcntl.lockf(self.fd, fcntl.LOCK_UN)
+
+        if available >= 0:
+            return 0
+        return -available / self.rate
+
+    def acquire(self, tokens=1):
+        """
+        Take tokens from the bucket, and wait until they are available.
+
+        :param tokens: number of tokens to take
+        :type tokens: int
+        :returns: number of seconds waited
+        :rtype: float
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            sleep(delay)
+        return delay
+
+    def close(self):
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+
+_buckets = {}
+_buckets_lock = Lock()
+
+
+def get_bucket(group, rate, burst=1, shared=True):
+    """
+    Get the :class:`TokenBucket` of a group, shared by every caller of the
+    process. The bucket is created with the given parameters on first call;
+    the same group name should not be used with different parameters.
+
+    :type group: str
+    :type rate: float
+    :type burst: int
+    :type shared: bool
+    :rtype: :class:`TokenBucket`
+    """
+    with _buckets_lock:
+        try:
+            return _buckets[group]
+        except KeyError:
+            bucket = _buckets[group] = TokenBucket(group, rate, burst, shared)
+            return bucket
+
+
+class RateLimiter(object):
+    """
+    Limit the rate of requests on each host, with a :class:`TokenBucket`
+    per host shared by every browser.
+
+    :param rate: number of requests per second
+    :type rate: float
+    :param burst: number of requests which can be made at once
+    :type burst: int
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+
+    def wait(self, url):
+        """
+        Wait before a request on *url*.
+
+        :type url: str
+        :returns: number of seconds waited
+        :rtype: float
+        """
+        host = urlsplit(url).hostname
+        if not host:
+            return 0
+        return get_bucket('host.%s' % host, self.rate, self.burst).acquire()
+
+
+def test_token_bucket():
+    bucket = TokenBucket('test', rate=1, burst=2, shared=False)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    # Tokens to come are taken by each caller in turn.
+    assert 0.5 < bucket.reserve() <= 1
+    assert 1.5 < bucket.reserve() <= 2
+
+
+def test_shared_token_bucket():
+    group = 'test.%d' % os.getpid()
+    first = TokenBucket(group, rate=0.1)
+    second = TokenBucket(group, rate=0.1)
+    try:
+        if first.path is None:
+            # Buckets are not shared on this system.
+            return
+        assert first.reserve() == 0
+        assert second.reserve() > 9
+    finally:
+        first.close()
+        second.close()
+        if first.path is not None:
+            os.unlink(first.path)
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+# Copyright(C) 2014 Romain Bignon
+#
+# This file is part of weboob.
+#
+# weboob is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# weboob is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with weboob. If not, see <http://www.gnu.org/licenses/>.
+
+
+from calendar import timegm
+from email.utils import parsedate
+from random import uniform
+from time import time, sleep
+import sys
+
+
+__all__ = ['RetryPolicy']
+
+
+class RetryPolicy(object):
+    """
+    Policy to retry HTTP requests which failed because of a transient error.
+
+    A request is retried if it fails with one of *exceptions* (for example
+    a connection error), or if the HTTP status of the response (or of the
+    error) is in *statuses*. Requests with a method which is not in *methods*
+    are never retried, as the server may already have processed them.
+
+    The delay between two tries grows exponentially from *delay*, up to
+    *max_delay*, and a random part of it (*jitter*) avoids that browsers
+    retry all at the same time. The ``Retry-After`` header sent by the
+    server is honored. No more than *budget* seconds are spent waiting for
+    a request.
+
+    >>> policy = RetryPolicy(delay=1, backoff=2, max_delay=3, jitter=0)
+    >>> [policy.get_delay(attempt) for attempt in range(4)]
+    [1.0, 2.0, 3.0, 3.0]
+    >>> RetryPolicy.parse_retry_after('120')
+    120.0
+    >>> RetryPolicy.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', now=1445412470)
+    10.0
+
+    :param tries: maximum number of tries of a request
+    :type tries: int
+    :param delay: delay in seconds before the first retry
+    :type delay: float
+    :param backoff: multiplier of the delay after each retry
+    :type backoff: float
+    :param max_delay: maximum delay between two tries
+    :type max_delay: float
+    :param jitter: part of the delay which is random, between 0 and 1
+    :type jitter: float
+    :param budget: maximum number of seconds spent waiting for a request
+    :type budget: float
+    :param statuses: HTTP statuses of transient errors
+    :type statuses: set[int]
+    :param methods: HTTP methods which can be retried
+    :type methods: set[str]
+    :param exceptions: exceptions of transient errors
+    :type exceptions: tuple
+    """
+
+    STATUSES = frozenset([408, 429, 500, 502, 503, 504])
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE'])
+
+    def __init__(self, tries=3, delay=0.5, backoff=2, max_delay=10, jitter=0.5,
+                 budget=10, statuses=STATUSES, methods=IDEMPOTENT_METHODS, exceptions=()):
+        self.tries = tries
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.budget = budget
+        self.statuses = statuses
+        self.methods = methods
+        self.exceptions = exceptions
+
+    @staticmethod
+    def get_response(obj):
+        """
+        Get the response of a result or of an error, which can come from
+        urllib2 or python-requests.
+        """
+        response = getattr(obj, 'response', None)
+        if response is not None:
+            return response
+        return obj
+
+    @classmethod
+    def get_status(cls, obj):
+        """
+        Get the HTTP status of a result or of an error, or None.
+        """
+        response = cls.get_response(obj)
+        status = getattr(response, 'status_code', None)
+        if status is None:
+            status = getattr(response, 'code', None)
+        if isinstance(status, int):
+            return status
+        return None
+
+    @classmethod
+    def get_retry_after(cls, obj):
+        """
+        Get the delay in seconds asked by the ``Retry-After`` header of a
+        result or of an error, or None.
+        """
+        response = cls.get_response(obj)
+        headers = getattr(response, 'headers', None)
+        if headers is None and hasattr(response, 'info'):
+            headers = response.info()
+        if headers is None:
+            return None
+        value = headers.get('Retry-After')
+        if value is None:
+            return None
+        return cls.parse_retry_after(value)
+
+    @staticmethod
+    def parse_retry_after(value, now=None):
+        """
+        Parse the value of a ``Retry-After`` header, which is a number of
+        seconds or a HTTP date.
+
+        :rtype: float or None
+        """
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        date = parsedate(value)
+        if date is None:
+            return None
+        if now is None:
+            now = time()
+        return max(float(timegm(date) - now), 0.)
+
+    def get_delay(self, attempt):
+        """
+        Get the delay before a retry.
+
+        :param attempt: number of retries already done
+        :type attempt: int
+        :rtype: float
+        """
+        delay = min(float(self.delay) * self.backoff ** attempt, self.max_delay)
+        return delay - uniform(0, delay * self.jitter)
+
+    def is_transient(self, obj):
+        """
+        Check if a result or an error is a transient error.
+        """
+        status = self.get_status(obj)
+        if status is not None:
+            return status in self.statuses
+        return isinstance(obj, BaseException) and isinstance(obj, self.exceptions)
+
+    def run(self, func, method='GET', logger=None):
+        """
+        Call *func* to make a request, and call it again as long as it fails
+        with a transient error.
+
+        An error is raised again, and a response is returned, when the
+        request can not be retried anymore.
+
+        :param func: function making the request
+        :type func: callable
+        :param method: HTTP method of the request
+        :type method: str
+        :param logger: logger of retries
+        :type logger: :class:`logging.Logger`
+        """
+        waited = 0
+        attempt = 0
+        while True:
+            error = None
+            try:
+                result = func()
+            except self.exceptions:
+                error = sys.exc_info()
+            except Exception:
+                error = sys.exc_info()
+                if self.get_status(error[1]) is None:
+                    raise
+            if error is not None:
+                result = error[1]
+
+            delay = None
+            if attempt + 1 < self.tries and method.upper() in self.methods and self.is_transient(result):
+                delay = self.get_delay(attempt)
+                retry_after = self.get_retry_after(result)
+                if retry_after is not None:
+                    delay = retry_after
+                if waited + delay > self.budget:
+                    delay = None
+
+            if delay is None:
+                if error is not None:
+                    raise error[0], error[1], error[2]
+                return result
+
+            if logger is not None:
+                reason = result if error is not None else u'HTTP status %s' % self.get_status(result)
+                logger.debug(u'%s, retrying in %.1f seconds...' % (reason, delay))
+            if hasattr(result, 'close'):
+                result.close()
+            sleep(delay)
+            waited += delay
+            attempt += 1
+
+
+class _Response(object):
+    def __init__(self, code, headers={}):
+        self.code = code
+        self.headers = headers
+
+
+def test_retry_error():
+    calls = []
+
+    def func():
+        calls.append(None)
+        if len(calls) < 3:
+            raise IOError('connection reset')
+        return 'ok'
+
+    policy = RetryPolicy(tries=3, delay=0, exceptions=(IOError,))
+    assert policy.run(func) == 'ok'
+    assert len(calls) == 3
+
+    # Requests which are not idempotent are never retried.
+    del calls[:]
+    try:
+        policy.run(func, method='POST')
+    except IOError:
+        pass
+    else:
+        assert False, 'IOError not raised'
+    assert len(calls) == 1
+
+
+def test_retry_status():
+    responses = [_Response(503), _Response(200)]
+    policy = RetryPolicy(delay=0)
+    assert policy.run(lambda: responses.pop(0)).code == 200
+    assert not responses
+
+    # Errors which are not transient are not retried.
+    responses = [_Response(404), _Response(200)]
+    assert policy.run(lambda: responses.pop(0)).code == 404
+
+    # The server asks to wait longer than the budget.
+    responses = [_Response(503, {'Retry-After': '60'}), _Response(200)]
+    assert policy.run(lambda: responses.pop(0)).code == 503
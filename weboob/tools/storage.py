@@ -18,8 +18,17 @@
 # along with weboob. If not, see <http://www.gnu.org/licenses/>.
 
 
+import atexit
+import os
+import sqlite3
+import cPickle
+from ast import literal_eval
+from collections import Mapping, MutableMapping
 from copy import deepcopy
+from threading import Lock, RLock, Timer
+from urllib import quote
 
+from .config.iconfig import ConfigError
 from .config.yamlconfig import YamlConfig
 
 
@@ -54,6 +63,12 @@ class IStorage(object):
         """
         raise NotImplementedError()
 
+    def flush(self):
+        """
+        Write on the disk changes which are not written yet.
+        """
+        pass
+
 
 class StandardStorage(IStorage):
     def __init__(self, path):
@@ -61,14 +76,12 @@ class StandardStorage(IStorage):
         self.config.load()
 
     def load(self, what, name, default={}):
-        d = {}
-        if not what in self.config.values:
-            self.config.values[what] = {}
-        else:
-            d = self.config.values[what].get(name, {})
+        # setdefault() is atomic, as backends may be loaded in parallel.
+        values = self.config.values.setdefault(what, {})
+        d = values.get(name, {})
 
-        self.config.values[what][name] = deepcopy(default)
-        self.config.values[what][name].update(d)
+        values[name] = deepcopy(default)
+        values[name].update(d)
 
     def save(self, what, name):
         self.config.save()
@@ -81,3 +94,487 @@ class StandardStorage(IStorage):
 
     def get(self, what, name, *args, **kwargs):
         return self.config.get(what, name, *args, **kwargs)
+
+
+class ShardedStorage(IStorage):
+    """
+    Storage which keeps data of each backend and of each application in its
+    own YAML file, in the directory *path*.d.
+
+    Calls to :func:`save` do not write anything: modified data are written
+    by a timer, at most *delay* seconds later, and only files of modified
+    backends or applications are written. Remaining changes are written by
+    :func:`flush`, which is also called at exit.
+
+    As modules change values returned by :func:`get` in place before calling
+    :func:`save`, values are copied by :func:`save` in the calling thread,
+    and the timer writes this copy. Changes made by :func:`set` and
+    :func:`delete` are also applied to the copy.
+
+    If the directory does not exist yet, data of the :class:`StandardStorage`
+    file *path* are imported.
+
+    :param path: path of the storage
+    :type path: :class:`str`
+    :param delay: maximum number of seconds before changes are written
+    :type delay: :class:`float`
+    """
+    DELAY = 5
+
+    def __init__(self, path, delay=DELAY):
+        self.path = path + '.d'
+        self.delay = delay
+        self.mutex = RLock()
+        self.write_mutex = Lock()
+        # Configs of loaded shards, by (what, name)
+        self.shards = {}
+        # Copies of values made by save(), to be written, by (what, name)
+        self.pending = {}
+        self.dirty = set()
+        self.timer = None
+
+        if not os.path.isdir(self.path) and os.path.isfile(path):
+            legacy = YamlConfig(path)
+            legacy.load()
+            for what, names in legacy.values.iteritems():
+                if not isinstance(names, dict):
+                    continue
+                for name, values in names.iteritems():
+                    self._get_shard(what, name).values = values
+                    self.dirty.add((what, name))
+            self.flush()
+
+        atexit.register(self.flush)
+
+    def _get_shard(self, what, name):
+        try:
+            return self.shards[(what, name)]
+        except KeyError:
+            filename = name
+            if isinstance(filename, unicode):
+                filename = filename.encode('utf-8')
+            shard = YamlConfig(os.path.join(self.path, quote(what, ''), quote(filename, '')))
+            if os.path.exists(shard.path):
+                shard.load()
+            self.shards[(what, name)] = shard
+            return shard
+
+    def load(self, what, name, default={}):
+        with self.mutex:
+            shard = self._get_shard(what, name)
+            values = deepcopy(default)
+            values.update(shard.values)
+            shard.values = values
+
+    def save(self, what, name):
+        with self.mutex:
+            shard = self._get_shard(what, name)
+            snapshot = YamlConfig(shard.path)
+            snapshot.values = deepcopy(shard.values)
+            self.pending[(what, name)] = snapshot
+            self.dirty.add((what, name))
+            if self.timer is None:
+                self.timer = Timer(self.delay, self.flush)
+                self.timer.setDaemon(True)
+                self.timer.start()
+
+    def flush(self):
+        # Files are written in the order of the snapshots.
+        with self.write_mutex:
+            with self.mutex:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+
+                snapshots = []
+                for key in self.dirty:
+                    snapshot = self.pending.pop(key, None)
+                    if snapshot is None:
+                        # Only changed by set() and delete(), which hold the
+                        # mutex.
+                        shard = self._get_shard(*key)
+                        snapshot = YamlConfig(shard.path)
+                        snapshot.values = deepcopy(shard.values)
+                    snapshots.append((key, snapshot))
+                self.dirty.clear()
+
+            while snapshots:
+                key, snapshot = snapshots[0]
+                try:
+                    dirname = os.path.dirname(snapshot.path)
+                    if not os.path.isdir(dirname):
+                        os.makedirs(dirname)
+                    snapshot.save()
+                except Exception:
+                    # Try again at the next flush, unless values have been
+                    # changed in the meantime.
+                    with self.mutex:
+                        for key, snapshot in snapshots:
+                            if key not in self.dirty:
+                                self.pending[key] = snapshot
+                                self.dirty.add(key)
+                    raise
+                snapshots.pop(0)
+
+    def set(self, what, name, *args):
+        with self.mutex:
+            self._get_shard(what, name).set(*args)
+            snapshot = self.pending.get((what, name))
+            if snapshot is not None:
+                snapshot.set(*deepcopy(args))
+            self.dirty.add((what, name))
+
+    def delete(self, what, name, *args):
+        with self.mutex:
+            shards = [self._get_shard(what, name)]
+            snapshot = self.pending.get((what, name))
+            if snapshot is not None:
+                shards.append(snapshot)
+            for shard in shards:
+                if args:
+                    shard.delete(*args)
+                else:
+                    shard.values = {}
+            self.dirty.add((what, name))
+
+    def get(self, what, name, *args, **kwargs):
+        with self.mutex:
+            shard = self._get_shard(what, name)
+            if not args:
+                return shard.values
+            return shard.get(*args, **kwargs)
+
+
+class SQLiteDict(MutableMapping):
+    """
+    Dictionary stored in a :class:`SQLiteStorage`.
+
+    Items are read from the database when they are used, and changes are
+    written to the database.
+    """
+    def __init__(self, storage, what, name, keys):
+        self.storage = storage
+        self.what = what
+        self.name = name
+        self.keys_path = keys
+
+    def __getitem__(self, key):
+        found, value = self.storage._lookup(self.what, self.name, self.keys_path + (key,))
+        if not found:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.storage.set(self.what, self.name, *(self.keys_path + (key, value)))
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.storage.delete(self.what, self.name, *(self.keys_path + (key,)))
+
+    def __contains__(self, key):
+        return self.storage._lookup(self.what, self.name, self.keys_path + (key,))[0]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return self.storage._count(self.what, self.name, self.keys_path)
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def keys(self):
+        return [key for key, value in self.storage._children(self.what, self.name, self.keys_path)]
+
+    def items(self):
+        return self.storage._children(self.what, self.name, self.keys_path)
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def values(self):
+        return [value for key, value in self.items()]
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def copy(self):
+        """
+        Get a copy of this dictionary and of its sub-dictionaries, as dict
+        objects.
+        """
+        return self.storage._load_tree(self.what, self.name, self.keys_path)
+
+
+class SQLiteStorage(IStorage):
+    """
+    Storage in the SQLite database *path*.sqlite.
+
+    Each value is stored in its own row, indexed by its path, so a value is
+    read or changed without loading the other ones. Dictionaries are
+    returned as :class:`SQLiteDict` objects, which read their items from the
+    database when they are used.
+
+    Changes are committed by :func:`save`. Lists and sets returned by
+    :func:`get` are also written again at this time, as they may have been
+    modified in place.
+
+    If the database does not exist yet, data of the :class:`StandardStorage`
+    file *path* are imported.
+
+    :param path: path of the storage
+    :type path: :class:`str`
+    """
+    # Separator of keys in paths. Keys are stored with repr(), which
+    # escapes it.
+    SEPARATOR = '\x01'
+
+    def __init__(self, path):
+        self.path = path + '.sqlite'
+        self.mutex = RLock()
+        # Mutable values returned by get(), by path
+        self.returned = {}
+
+        new = not os.path.exists(self.path)
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.text_factory = str
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS storage (what TEXT NOT NULL, name TEXT NOT NULL, '
+                        'path TEXT NOT NULL, parent TEXT, value BLOB, PRIMARY KEY (what, name, path))')
+        self.db.execute('CREATE INDEX IF NOT EXISTS storage_parent ON storage (what, name, parent)')
+        self.db.commit()
+
+        if new and os.path.isfile(path):
+            legacy = YamlConfig(path)
+            legacy.load()
+            with self.mutex:
+                for what, names in legacy.values.iteritems():
+                    if not isinstance(names, dict):
+                        continue
+                    for name, values in names.iteritems():
+                        self.set(what, name, values)
+                self.db.commit()
+
+        atexit.register(self.flush)
+
+    @staticmethod
+    def _encode(keys):
+        parts = []
+        for key in keys:
+            if isinstance(key, unicode):
+                try:
+                    key = key.encode('ascii')
+                except UnicodeError:
+                    pass
+            parts.append(repr(key))
+        return SQLiteStorage.SEPARATOR.join(parts)
+
+    @staticmethod
+    def _decode_key(path):
+        return literal_eval(path.rsplit(SQLiteStorage.SEPARATOR, 1)[-1])
+
+    @staticmethod
+    def _id(what, name):
+        if isinstance(name, unicode):
+            name = name.encode('utf-8')
+        return what, name
+
+    def _lookup(self, what, name, keys):
+        """
+        Get a value.
+
+        :returns: True if the value exists, and the value
+        :rtype: tuple
+        """
+        if not keys:
+            return True, SQLiteDict(self, what, name, ())
+
+        path = self._encode(keys)
+        with self.mutex:
+            try:
+                return True, self.returned[(self._id(what, name), path)]
+            except KeyError:
+                pass
+
+            row = self.db.execute('SELECT value FROM storage WHERE what = ? AND name = ? AND path = ?',
+                                  self._id(what, name) + (path,)).fetchone()
+            if row is None:
+                return False, None
+            if row[0] is None:
+                return True, SQLiteDict(self, what, name, tuple(keys))
+
+            return True, self._unpickle(what, name, path, row[0])
+
+    def _unpickle(self, what, name, path, data):
+        value = cPickle.loads(str(data))
+        if isinstance(value, (list, set)):
+            self.returned[(self._id(what, name), path)] = value
+        return value
+
+    def _children(self, what, name, keys):
+        with self.mutex:
+            rows = self.db.execute('SELECT path, value FROM storage WHERE what = ? AND name = ? AND parent = ?',
+                                   self._id(what, name) + (self._encode(keys),)).fetchall()
+            items = []
+            for path, value in rows:
+                key = self._decode_key(path)
+                if value is None:
+                    value = SQLiteDict(self, what, name, tuple(keys) + (key,))
+                elif (self._id(what, name), path) in self.returned:
+                    value = self.returned[(self._id(what, name), path)]
+                else:
+                    value = self._unpickle(what, name, path, value)
+                items.append((key, value))
+            return items
+
+    def _count(self, what, name, keys):
+        with self.mutex:
+            return self.db.execute('SELECT COUNT(*) FROM storage WHERE what = ? AND name = ? AND parent = ?',
+                                   self._id(what, name) + (self._encode(keys),)).fetchone()[0]
+
+    def _load_tree(self, what, name, keys):
+        path = self._encode(keys)
+        with self.mutex:
+            rows = self._select_tree(what, name, path, 'path, value')
+        tree = {}
+        nodes = {path: tree}
+        for child_path, value in rows:
+            if child_path == path:
+                continue
+            parent, sep, key = child_path.rpartition(self.SEPARATOR)
+            key = literal_eval(key)
+            if value is None:
+                value = nodes[child_path] = {}
+            else:
+                value = cPickle.loads(str(value))
+            nodes[parent][key] = value
+        return tree
+
+    @staticmethod
+    def _path_end(path):
+        # Paths of a value and of its descendants are between path and this
+        # one, as repr() never gives characters lower than the separator.
+        return path + chr(ord(SQLiteStorage.SEPARATOR) + 1)
+
+    def _select_tree(self, what, name, path, columns):
+        # Rows of the value at path and of its descendants, sorted so parents
+        # come before their children.
+        if not path:
+            return self.db.execute('SELECT %s FROM storage WHERE what = ? AND name = ? ORDER BY path' % columns,
+                                   self._id(what, name)).fetchall()
+        return self.db.execute('SELECT %s FROM storage WHERE what = ? AND name = ? AND '
+                               'path >= ? AND path < ? ORDER BY path' % columns,
+                               self._id(what, name) + (path, self._path_end(path))).fetchall()
+
+    def _delete(self, what, name, path):
+        if not path:
+            self.db.execute('DELETE FROM storage WHERE what = ? AND name = ?', self._id(what, name))
+        else:
+            self.db.execute('DELETE FROM storage WHERE what = ? AND name = ? AND path >= ? AND path < ?',
+                            self._id(what, name) + (path, self._path_end(path)))
+
+        for key in self.returned.keys():
+            if key[0] == self._id(what, name) and (not path or key[1] == path or key[1].startswith(path + self.SEPARATOR)):
+                self.returned.pop(key)
+
+    def _insert(self, what, name, keys, value):
+        path = self._encode(keys)
+        parent = self._encode(keys[:-1]) if keys else None
+        if isinstance(value, Mapping):
+            if keys:
+                self.db.execute('INSERT INTO storage (what, name, path, parent, value) VALUES (?, ?, ?, ?, NULL)',
+                                self._id(what, name) + (path, parent))
+            for key, item in value.iteritems():
+                self._insert(what, name, keys + (key,), item)
+        else:
+            self.db.execute('INSERT INTO storage (what, name, path, parent, value) VALUES (?, ?, ?, ?, ?)',
+                            self._id(what, name) + (path, parent, sqlite3.Binary(cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL))))
+
+    def _store(self, what, name, keys, value):
+        if isinstance(value, SQLiteDict):
+            value = value.copy()
+
+        with self.mutex:
+            # Create missing parent dictionaries.
+            for i in xrange(1, len(keys)):
+                found, parent = self._lookup(what, name, keys[:i])
+                if not found:
+                    self._insert(what, name, keys[:i], {})
+                elif not isinstance(parent, SQLiteDict):
+                    raise ConfigError()
+
+            self._delete(what, name, self._encode(keys))
+            self._insert(what, name, keys, value)
+
+    def load(self, what, name, default={}):
+        with self.mutex:
+            for key, value in default.iteritems():
+                if not self._lookup(what, name, (key,))[0]:
+                    self._store(what, name, (key,), deepcopy(value))
+
+    def save(self, what, name):
+        self.flush()
+
+    def flush(self):
+        with self.mutex:
+            for ((what, name), path), value in self.returned.items():
+                self.db.execute('UPDATE storage SET value = ? WHERE what = ? AND name = ? AND path = ?',
+                                (sqlite3.Binary(cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)), what, name, path))
+            self.db.commit()
+
+    def set(self, what, name, *args):
+        self._store(what, name, tuple(args[:-1]), args[-1])
+
+    def delete(self, what, name, *args):
+        with self.mutex:
+            self._delete(what, name, self._encode(args))
+
+    def get(self, what, name, *args, **kwargs):
+        default = kwargs.get('default', None)
+        with self.mutex:
+            found, value = self._lookup(what, name, args)
+            if found:
+                return value
+
+            if default is None and len(args) > 1 and \
+               not isinstance(self._lookup(what, name, args[:-1])[1], SQLiteDict):
+                raise ConfigError()
+            return default
+
+
+def _test_roundtrip(klass):
+    from shutil import rmtree
+    from tempfile import mkdtemp
+
+    tmpdir = mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'storage')
+        legacy = YamlConfig(path)
+        legacy.values = {'backends': {'old': {'seen': [1, 2]}}}
+        legacy.save()
+
+        storage = klass(path)
+        storage.load('backends', u'bé', {'config': {'a': 1}, 'seen': []})
+        storage.set('backends', u'bé', 'config', 'b', {'c': u'é'})
+        storage.get('backends', u'bé', 'seen').append(42)
+        storage.delete('backends', u'bé', 'config', 'a')
+        storage.save('backends', u'bé')
+        storage.flush()
+
+        storage = klass(path)
+        assert storage.get('backends', u'bé', 'config', 'b', 'c') == u'é'
+        assert storage.get('backends', u'bé', 'config', 'a') is None
+        assert storage.get('backends', u'bé', 'seen') == [42]
+        assert storage.get('backends', 'old', 'seen') == [1, 2]
+        assert storage.get('backends', 'other', 'seen', default=[]) == []
+    finally:
+        rmtree(tmpdir)
+
+
+def test_sharded():
+    _test_roundtrip(ShardedStorage)
+
+
+def test_sqlite():
+    _test_roundtrip(SQLiteStorage)